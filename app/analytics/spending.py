@@ -0,0 +1,335 @@
+import datetime
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.database import db_manager
+from app.database.db_manager import get_account_version, read_transaction_columns
+from app.executors.pool import offload
+
+SECONDS_PER_DAY = 86400
+
+
+class TransactionFrame:
+    """Columnar, NumPy-backed view of a user's transaction history
+
+    Amounts are integer cents and timestamps integer epoch seconds, matching
+    the storage format. Categories and descriptions are dictionary-encoded
+    into integer codes so they can be grouped with bincount/reduceat.
+    """
+
+    def __init__(self, ts: np.ndarray, amount_cents: np.ndarray, is_debit: np.ndarray,
+                 category_codes: np.ndarray, categories: List[str],
+                 description_codes: np.ndarray, descriptions: List[str]):
+        self.ts = ts
+        self.amount_cents = amount_cents
+        self.is_debit = is_debit
+        self.category_codes = category_codes
+        self.categories = categories
+        self.description_codes = description_codes
+        self.descriptions = descriptions
+
+    def __len__(self):
+        return self.ts.size
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[tuple]) -> "TransactionFrame":
+        """Build a frame from (transaction_ts, amount_cents, transaction_type, category, description) tuples"""
+        n = len(rows)
+        if n == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return cls(empty, empty, np.empty(0, dtype=bool), empty, [], empty, [])
+
+        ts, amounts, types, categories, descriptions = zip(*rows)
+        category_codes, category_labels = _encode(categories)
+        description_codes, description_labels = _encode(descriptions)
+
+        return cls(
+            ts=np.fromiter(ts, dtype=np.int64, count=n),
+            amount_cents=np.fromiter(amounts, dtype=np.int64, count=n),
+            is_debit=np.fromiter((t == 'debit' for t in types), dtype=bool, count=n),
+            category_codes=category_codes,
+            categories=category_labels,
+            description_codes=description_codes,
+            descriptions=description_labels,
+        )
+
+
+def _encode(values: Sequence[Optional[str]]) -> Tuple[np.ndarray, List[str]]:
+    codes: Dict[Optional[str], int] = {}
+    encoded = np.fromiter((codes.setdefault(v, len(codes)) for v in values), dtype=np.int64, count=len(values))
+    return encoded, [label or "uncategorized" for label in codes]
+
+
+def monthly_trends(frame: TransactionFrame, window: int = 3) -> Dict[str, Any]:
+    """Spending and income per calendar month, with a rolling average of spending
+
+    Args:
+        frame: The transactions to aggregate
+        window: Number of months in the rolling average
+
+    Returns:
+        Dictionary with 'months' labels and per-month 'spent_cents',
+        'income_cents' and 'rolling_spent_cents' arrays
+    """
+    if len(frame) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return {'months': [], 'spent_cents': empty, 'income_cents': empty, 'rolling_spent_cents': empty}
+
+    months = frame.ts.astype('datetime64[s]').astype('datetime64[M]').astype(np.int64)
+    first = months.min()
+    index = months - first
+    size = int(index.max()) + 1
+
+    debit = frame.is_debit
+    spent = np.bincount(index[debit], weights=frame.amount_cents[debit], minlength=size)
+    income = np.bincount(index[~debit], weights=frame.amount_cents[~debit], minlength=size)
+
+    labels = np.arange(first, first + size).astype('datetime64[M]').astype(str).tolist()
+    return {
+        'months': labels,
+        'spent_cents': np.rint(spent).astype(np.int64),
+        'income_cents': np.rint(income).astype(np.int64),
+        'rolling_spent_cents': rolling_average(spent, window),
+    }
+
+
+def rolling_average(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing rolling mean; the first window-1 entries average what is available"""
+    sums = np.cumsum(values, dtype=np.float64)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts = np.minimum(np.arange(1, values.size + 1), window)
+    return sums / counts
+
+
+def category_shares(frame: TransactionFrame, since_ts: int = 0) -> List[Dict[str, Any]]:
+    """Debit totals per category, largest first, with their share of all spending"""
+    mask = frame.is_debit & (frame.ts >= since_ts)
+    totals = np.bincount(frame.category_codes[mask], weights=frame.amount_cents[mask],
+                         minlength=len(frame.categories))
+    total = totals.sum()
+    if total <= 0:
+        return []
+
+    order = np.argsort(totals)[::-1]
+    order = order[totals[order] > 0]
+    return [
+        {
+            'category': frame.categories[code],
+            'amount_cents': int(round(totals[code])),
+            'percentage': float(totals[code] / total * 100),
+        }
+        for code in order
+    ]
+
+
+def detect_recurring(frame: TransactionFrame, min_occurrences: int = 3,
+                     tolerance: float = 0.15) -> List[Dict[str, Any]]:
+    """Find debits that repeat at a regular interval for a stable amount
+
+    Debits are grouped by description. A group is recurring when it has at
+    least min_occurrences entries and both the gaps between them and their
+    amounts vary by no more than tolerance (coefficient of variation).
+    """
+    mask = frame.is_debit
+    if np.count_nonzero(mask) < min_occurrences:
+        return []
+
+    codes = frame.description_codes[mask]
+    ts = frame.ts[mask]
+    amounts = frame.amount_cents[mask].astype(np.float64)
+
+    order = np.lexsort((ts, codes))
+    codes, ts, amounts = codes[order], ts[order], amounts[order]
+
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    counts = np.diff(np.r_[starts, codes.size])
+
+    # Gap before each row; the first row of every group has no predecessor
+    gaps = np.r_[0.0, np.diff(ts).astype(np.float64)]
+    gaps[starts] = 0.0
+
+    gap_counts = counts - 1
+    candidates = counts >= min_occurrences
+    if not candidates.any():
+        return []
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gap_mean = np.add.reduceat(gaps, starts) / gap_counts
+        gap_var = np.add.reduceat(gaps * gaps, starts) / gap_counts - gap_mean ** 2
+        gap_cv = np.sqrt(np.maximum(gap_var, 0.0)) / gap_mean
+
+        amount_mean = np.add.reduceat(amounts, starts) / counts
+        amount_var = np.add.reduceat(amounts * amounts, starts) / counts - amount_mean ** 2
+        amount_cv = np.sqrt(np.maximum(amount_var, 0.0)) / amount_mean
+
+    recurring = (candidates & (gap_mean >= SECONDS_PER_DAY)
+                 & (gap_cv <= tolerance) & (amount_cv <= tolerance))
+
+    last_rows = starts + counts - 1
+    return [
+        {
+            'description': frame.descriptions[codes[starts[g]]],
+            'occurrences': int(counts[g]),
+            'interval_days': float(gap_mean[g] / SECONDS_PER_DAY),
+            'average_amount_cents': int(round(amount_mean[g])),
+            'last_ts': int(ts[last_rows[g]]),
+        }
+        for g in np.flatnonzero(recurring)
+    ]
+
+
+def detect_anomalies(frame: TransactionFrame, since_ts: int = 0, threshold: float = 3.0,
+                     min_samples: int = 5, limit: int = 5) -> List[Dict[str, Any]]:
+    """Flag debits far above their category's usual amount
+
+    Each debit is scored against the mean and standard deviation of all debits
+    in its category; debits since since_ts with a z-score above threshold are
+    returned, most recent first.
+    """
+    mask = frame.is_debit
+    if not mask.any():
+        return []
+
+    size = len(frame.categories)
+    codes = frame.category_codes[mask]
+    amounts = frame.amount_cents[mask].astype(np.float64)
+
+    counts = np.bincount(codes, minlength=size)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.bincount(codes, weights=amounts, minlength=size) / counts
+        var = np.bincount(codes, weights=amounts * amounts, minlength=size) / counts - mean ** 2
+        std = np.sqrt(np.maximum(var, 0.0))
+        scores = (amounts - mean[codes]) / std[codes]
+
+    ts = frame.ts[mask]
+    flagged = ((counts[codes] >= min_samples) & (std[codes] > 0)
+               & (scores > threshold) & (ts >= since_ts))
+    rows = np.flatnonzero(flagged)
+    rows = rows[np.argsort(ts[rows])[::-1][:limit]]
+
+    descriptions = frame.description_codes[mask]
+    return [
+        {
+            'description': frame.descriptions[descriptions[i]],
+            'category': frame.categories[codes[i]],
+            'amount_cents': int(amounts[i]),
+            'z_score': float(scores[i]),
+            'ts': int(ts[i]),
+        }
+        for i in rows
+    ]
+
+
+def summarize(frame: TransactionFrame, now_ts: Optional[int] = None, days: int = 30) -> Dict[str, Any]:
+    """Run every analysis over a frame
+
+    Category shares and anomalies cover the last `days` days; trends and
+    recurring payments use the whole history.
+    """
+    now_ts = int(time.time()) if now_ts is None else now_ts
+    since_ts = now_ts - days * SECONDS_PER_DAY
+    return {
+        'period_days': days,
+        'transaction_count': len(frame),
+        'monthly': monthly_trends(frame),
+        'categories': category_shares(frame, since_ts),
+        'recurring': detect_recurring(frame),
+        'anomalies': detect_anomalies(frame, since_ts),
+    }
+
+
+def _dollars(cents: float) -> str:
+    return f"${cents / 100:,.2f}"
+
+
+def _date(ts: int) -> str:
+    return datetime.datetime.fromtimestamp(ts).strftime('%Y-%m-%d')
+
+
+def format_summary(summary: Dict[str, Any], months: int = 6, top: int = 5) -> str:
+    """Render a summary as a compact block of text for the LLM context"""
+    lines = []
+
+    monthly = summary['monthly']
+    if monthly['months']:
+        trend = "; ".join(
+            f"{label} {_dollars(spent)} (avg {_dollars(avg)})"
+            for label, spent, avg in list(zip(monthly['months'], monthly['spent_cents'],
+                                              monthly['rolling_spent_cents']))[-months:]
+        )
+        lines.append(f"Monthly spending: {trend}")
+
+    if summary['categories']:
+        shares = ", ".join(
+            f"{c['category']} {_dollars(c['amount_cents'])} ({c['percentage']:.1f}%)"
+            for c in summary['categories'][:top]
+        )
+        lines.append(f"Top categories (last {summary['period_days']} days): {shares}")
+
+    if summary['recurring']:
+        recurring = "; ".join(
+            f"{r['description']} ~every {r['interval_days']:.0f} days ({_dollars(r['average_amount_cents'])})"
+            for r in sorted(summary['recurring'], key=lambda r: r['average_amount_cents'], reverse=True)[:top]
+        )
+        lines.append(f"Recurring payments: {recurring}")
+
+    if summary['anomalies']:
+        anomalies = "; ".join(
+            f"{_date(a['ts'])} {a['description']} {_dollars(a['amount_cents'])} ({a['category']})"
+            for a in summary['anomalies']
+        )
+        lines.append(f"Unusual transactions: {anomalies}")
+
+    return "\n".join(lines)
+
+
+def load_frame(username: str, database_path: str) -> TransactionFrame:
+    """Read a user's transactions and build their frame
+
+    Meant for the "cpu" queue: for long histories both the query and the
+    conversion to columns take tens of milliseconds. Reading in the worker
+    also avoids pickling every row across to it.
+    """
+    return TransactionFrame.from_rows(read_transaction_columns(username, database_path=database_path))
+
+
+# Backstop for writes the account version cannot see, e.g. a restored database
+FRAME_TTL = float(os.environ.get("SPENDING_FRAME_TTL", 300))
+
+
+class SpendingAnalytics:
+    """Loads users' transaction histories into frames and analyzes them
+
+    Loaded frames are kept in an LRU keyed by username and reused until the
+    user's account write version changes or they are older than the TTL.
+    """
+
+    def __init__(self, max_users: int = 128, ttl: float = FRAME_TTL):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._frames: "OrderedDict[str, Tuple[int, float, TransactionFrame]]" = OrderedDict()
+
+    async def get_frame(self, username: str) -> TransactionFrame:
+        """Get the user's transactions, loading them if not cached or stale"""
+        version = await get_account_version(username)
+        entry = self._frames.get(username)
+        if entry is not None and entry[0] == version and time.monotonic() - entry[1] < self.ttl:
+            self._frames.move_to_end(username)
+            return entry[2]
+
+        loaded_at = time.monotonic()
+        frame = await offload("cpu", load_frame, username, db_manager.DATABASE_PATH)
+
+        self._frames[username] = (version, loaded_at, frame)
+        self._frames.move_to_end(username)
+        while len(self._frames) > self.max_users:
+            self._frames.popitem(last=False)
+        return frame
+
+    async def get_summary(self, username: str, days: int = 30) -> Dict[str, Any]:
+        """Get the spending summary for a user"""
+        return summarize(await self.get_frame(username), days=days)
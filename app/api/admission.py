@@ -0,0 +1,180 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+from app.auth.jwt import get_username_from_token
+
+# Requests that end in LLM calls, and how many tokens each costs. The batch
+# endpoint is not listed: it charges itself per query once its body has
+# been read (see AdmissionController.admit).
+LLM_PATH_COSTS: Dict[str, float] = {
+    "/api/secure-query": 1.0,
+}
+
+USER_RATE = float(os.environ.get("ADMISSION_USER_RATE", 2.0))
+USER_BURST = float(os.environ.get("ADMISSION_USER_BURST", 20))
+ANON_RATE = float(os.environ.get("ADMISSION_ANON_RATE", 0.5))
+ANON_BURST = float(os.environ.get("ADMISSION_ANON_BURST", 10))
+MAX_INFLIGHT = int(os.environ.get("ADMISSION_MAX_INFLIGHT", 32))
+# Anonymous requests may only fill this many of the in-flight slots, which
+# keeps the rest free for authenticated users.
+ANON_MAX_INFLIGHT = int(os.environ.get("ADMISSION_ANON_MAX_INFLIGHT", MAX_INFLIGHT // 2))
+
+
+class TokenBucketLimiter:
+    """Token buckets for many keys
+
+    Each key holds only its token count and last update time, refilled
+    lazily on access. Keys are kept in least-recently-used order, so keys
+    idle long enough to be full again are evicted from the front in O(1)
+    amortized time; dropping them loses nothing.
+
+    A cost above the capacity is admitted from a full bucket and leaves it
+    in debt, so the key waits for the whole cost to refill before its next
+    request.
+    """
+
+    def __init__(self, rate: float, capacity: float, max_keys: int = 100000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def acquire(self, key: str, cost: float = 1.0, now: Optional[float] = None) -> float:
+        """Take cost tokens from a key's bucket
+
+        Returns:
+            0 if the tokens were taken, otherwise the seconds until they
+            would be available (nothing is taken in that case)
+        """
+        now = time.monotonic() if now is None else now
+        self._evict_idle(now)
+
+        needed = min(cost, self.capacity)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [self.capacity, now]
+            self._buckets[key] = bucket
+        else:
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+
+        if bucket[0] >= needed:
+            bucket[0] -= cost
+            return 0.0
+        return (needed - bucket[0]) / self.rate
+
+    def _evict_idle(self, now: float) -> None:
+        while self._buckets:
+            key, (tokens, updated) = next(iter(self._buckets.items()))
+            if tokens + (now - updated) * self.rate < self.capacity and len(self._buckets) < self.max_keys:
+                break
+            self._buckets.popitem(last=False)
+
+
+class AdmissionRejected(HTTPException):
+    """An over-limit request, answered with 429 (rate) or 503 (capacity)"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+
+class AdmissionController:
+    """Rate limits and the in-flight cap for LLM-bound work
+
+    Authenticated users are limited per username, anonymous callers per
+    client IP with a lower rate. A global in-flight cap bounds concurrent
+    LLM-bound work, with part of it reserved for authenticated users.
+    """
+
+    def __init__(self):
+        self.user_limiter = TokenBucketLimiter(USER_RATE, USER_BURST)
+        self.anon_limiter = TokenBucketLimiter(ANON_RATE, ANON_BURST)
+        self.inflight = 0
+
+    def admit(self, username: Optional[str], client_host: Optional[str],
+              cost: float = 1.0, slots: int = 1) -> None:
+        """Take cost tokens and reserve slots in-flight slots
+
+        Requests that run several LLM calls at once (the batch endpoint)
+        reserve a slot for each. The caller must release the slots when done.
+
+        Raises:
+            AdmissionRejected: If the caller is over its rate or the server
+                is at capacity; nothing is taken or reserved in that case
+        """
+        if username:
+            key, limiter, inflight_limit = username, self.user_limiter, MAX_INFLIGHT
+        else:
+            key, limiter, inflight_limit = client_host or "unknown", self.anon_limiter, ANON_MAX_INFLIGHT
+
+        if self.inflight + slots > inflight_limit:
+            raise AdmissionRejected(503, "Server is at capacity, please retry shortly", 1)
+
+        wait = limiter.acquire(key, cost)
+        if wait > 0:
+            raise AdmissionRejected(429, "Too many requests", wait)
+
+        self.inflight += slots
+
+    def release(self, slots: int = 1) -> None:
+        self.inflight -= slots
+
+
+admission_controller = AdmissionController()
+
+
+class AdmissionControlMiddleware:
+    """Admit LLM-bound requests through the AdmissionController before they run
+
+    Over-limit requests are rejected immediately with 429 (rate) or 503
+    (capacity) and a Retry-After header rather than queued.
+    """
+
+    def __init__(self, app, path_costs: Dict[str, float] = None, controller: AdmissionController = None):
+        self.app = app
+        self.path_costs = path_costs or LLM_PATH_COSTS
+        self.controller = controller or admission_controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.path_costs:
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        try:
+            self.controller.admit(
+                _username_from_scope(scope), client[0] if client else None, self.path_costs[scope["path"]]
+            )
+        except AdmissionRejected as e:
+            response = JSONResponse(status_code=e.status_code, content={"detail": e.detail}, headers=e.headers)
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
+
+
+def _username_from_scope(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            authorization = value.decode("latin-1")
+            if authorization.startswith("Bearer "):
+                return get_username_from_token(authorization[len("Bearer "):])
+            return None
+    return None
@@ -0,0 +1,50 @@
+import os
+from typing import Optional
+
+from app.cache.backends import create_cache
+from app.database.db_manager import get_account_version
+
+# Backstop for writes the account version cannot see, e.g. a restored database
+CONTEXT_SNAPSHOT_TTL = float(os.environ.get("CONTEXT_SNAPSHOT_TTL", 300))
+
+
+class ContextSnapshotCache:
+    """Per-user cache of formatted LLM context strings
+
+    Snapshots are keyed by (username, intent) and tagged with the account
+    write version they were built from. A snapshot is only served while the
+    account version is unchanged. The version is kept in the database and
+    bumped in the same transaction as every account write, so any write
+    invalidates the snapshot across workers; the TTL only bounds how long
+    a snapshot can outlive a write that bypassed the version.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = CONTEXT_SNAPSHOT_TTL):
+        self._store = create_cache("context_snapshots", max_entries=max_entries)
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(username: str, intent_tag: str) -> str:
+        return f"{username}\x00{intent_tag}"
+
+    async def get(self, username: str, intent_tag: str) -> Optional[str]:
+        """Get the cached context if it is still current"""
+        key = self._key(username, intent_tag)
+        entry = await self._store.aget(key)
+        if entry is None:
+            return None
+
+        version, context = entry
+        if version != await get_account_version(username):
+            await self._store.adelete(key)
+            return None
+
+        return context
+
+    async def set(self, username: str, intent_tag: str, version: int, context: str) -> None:
+        """Store a context built from the rows at the given account version
+
+        The version must be read before the rows are queried, so a write that
+        races with the query leaves a snapshot that is already stale.
+        """
+        await self._store.aset(self._key(username, intent_tag), [version, context], ttl=self.ttl)
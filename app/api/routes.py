@@ -1,22 +1,53 @@
 from fastapi import APIRouter, Depends, BackgroundTasks, Header, HTTPException, status
-from typing import Optional
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from typing import Dict, Optional
+from pydantic import BaseModel, conlist
+import asyncio
+import json
+import logging
+import os
 from app.auth.jwt import get_current_user, User, oauth2_scheme
 from app.database.db_manager import (
     get_client_data, get_account_balance, 
-    get_recent_transactions, get_all_recent_transactions
+    get_recent_transactions, get_all_recent_transactions,
+    get_account_version
 )
-from app.models.llm_service import LLMService
+from app.models.llm_service import load_llm_service, normalize_query
+from app.api.admission import admission_controller
+from app.api.context_cache import ContextSnapshotCache
+from app.executors.pool import offload
+from app.sessions.store import Session, SessionStore
 from fastapi.security import OAuth2PasswordBearer
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
-llm_service = LLMService()
+context_cache = ContextSnapshotCache()
+spending_analytics = None
+session_store = SessionStore()
+
+# Intents whose context is built only from the user's own account rows, so
+# it stays valid until the account is written to. Spending analysis is left
+# out: it covers the last 30 days and changes as time passes. Its per-user
+# frame is still cached by version, only the summary is recomputed.
+USER_CONTEXT_INTENTS = ("account_balance", "transaction_history")
+
+BATCH_MAX_QUERIES = int(os.environ.get("BATCH_MAX_QUERIES", 500))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", 8))
 
 class QueryRequest(BaseModel):
     query: str
+    session_id: Optional[str] = None
 
 class QueryResponse(BaseModel):
     response: str
+    session_id: Optional[str] = None
+
+class SessionResponse(BaseModel):
+    session_id: str
+
+class BatchQueryRequest(BaseModel):
+    queries: conlist(str, min_items=1, max_items=BATCH_MAX_QUERIES)
 
 async def get_optional_user(authorization: Optional[str] = Header(None)):
     if not authorization:
@@ -31,25 +62,172 @@ async def get_optional_user(authorization: Optional[str] = Header(None)):
     
     return None
 
+@router.post("/sessions", response_model=SessionResponse)
+async def create_session(current_user: Optional[User] = Depends(get_optional_user)):
+    session = await session_store.create(current_user.username if current_user else None)
+    return SessionResponse(session_id=session.session_id)
+
+@router.delete("/sessions/{session_id}")
+async def delete_session(session_id: str, current_user: Optional[User] = Depends(get_optional_user)):
+    if not await session_store.delete(session_id, current_user.username if current_user else None):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+    return {"status": "deleted"}
+
 @router.post("/secure-query", response_model=QueryResponse)
 async def secure_query(
     request: QueryRequest,
+    background_tasks: BackgroundTasks,
     current_user: Optional[User] = Depends(get_optional_user)
 ):
     query = request.query
     
-    intent_tag = llm_service.interpret_user_intent(query)
+    session = None
+    if request.session_id:
+        session = await session_store.get(request.session_id, current_user.username if current_user else None)
+        if session is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+    
+    llm_service = await load_llm_service()
+    
+    previous_query = session.last_user_message() if session else None
+    intent_tag = await offload("llm", llm_service.interpret_user_intent, query, previous_query)
     
     if current_user:
         context = await get_context_for_intent(intent_tag, current_user.username)
     else:
         context = await get_context_for_intent(intent_tag, None)
     
-    response = llm_service.generate_response(query, context)
+    if session is None:
+        response = await offload("llm", llm_service.generate_response, query, context)
+        return QueryResponse(response=response)
+    
+    response = await offload(
+        "llm", llm_service.generate_response, query, context, session.history(), session.summary
+    )
+    
+    compact = False
+    
+    def record_turn(current: Session):
+        nonlocal compact
+        current.add("user", query)
+        current.add("assistant", response)
+        compact = current.needs_compaction()
+        if compact:
+            current.start_compaction()
     
-    return QueryResponse(response=response)
+    saved = await session_store.update(session.session_id, session.owner, record_turn)
+    if saved is not None and compact:
+        background_tasks.add_task(compact_session, saved)
+    
+    return QueryResponse(response=response, session_id=session.session_id)
+
+async def compact_session(session: Session):
+    """Fold a session's oldest turns into its rolling summary
+    
+    Turns may be added by any worker while the summary is generated, so it
+    is applied to the stored session with an update.
+    """
+    messages = session.oldest_for_compaction()
+    summary = None
+    try:
+        if messages:
+            llm_service = await load_llm_service()
+            summary = await offload(
+                "llm", llm_service.summarize_conversation, session.summary, [m.to_dict() for m in messages]
+            )
+    finally:
+        def finish(current: Session):
+            if summary:
+                current.compact(messages, summary)
+            current.compacting_until = 0.0
+        
+        await session_store.update(session.session_id, session.owner, finish)
+
+@router.post("/secure-query/batch")
+async def secure_query_batch(
+    request: BatchQueryRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Answer many queries in one request, for authenticated users only
+    
+    Identical queries (after normalization) are answered once, each intent's
+    context is looked up once for the whole batch, and at most
+    BATCH_CONCURRENCY queries are in flight. Admission control charges one
+    token per distinct query and counts each concurrent query against the
+    in-flight cap. Results are streamed as newline-delimited JSON in request
+    order, each line sent as soon as it and everything before it are done.
+    """
+    username = current_user.username
+    
+    slots: Dict[str, int] = {}
+    unique_queries = []
+    order = []
+    for query in request.queries:
+        key = normalize_query(query)
+        if key not in slots:
+            slots[key] = len(unique_queries)
+            unique_queries.append(query)
+        order.append(slots[key])
+    
+    llm_service = await load_llm_service()
+    concurrency = min(BATCH_CONCURRENCY, len(unique_queries))
+    admission_controller.admit(username, None, cost=len(unique_queries), slots=concurrency)
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    contexts: Dict[str, asyncio.Task] = {}
+    
+    async def answer(query: str):
+        async with semaphore:
+            intent_tag = await offload("llm", llm_service.interpret_user_intent, query)
+            if intent_tag not in contexts:
+                contexts[intent_tag] = asyncio.ensure_future(get_context_for_intent(intent_tag, username))
+            context = await contexts[intent_tag]
+            response = await offload("llm", llm_service.generate_response, query, context)
+            return intent_tag, response
+    
+    tasks = [asyncio.ensure_future(answer(query)) for query in unique_queries]
+    # Release the slots once every query has finished or been cancelled,
+    # even if the response is never streamed
+    asyncio.gather(*tasks, return_exceptions=True).add_done_callback(
+        lambda _: admission_controller.release(concurrency)
+    )
+    
+    async def stream():
+        try:
+            for index, slot in enumerate(order):
+                try:
+                    intent_tag, response = await tasks[slot]
+                    result = {"index": index, "intent": intent_tag, "response": response}
+                except Exception as e:
+                    logger.error(f"Error answering batch query {index}: {str(e)}")
+                    result = {"index": index, "error": "Failed to process query"}
+                yield json.dumps(result) + "\n"
+        finally:
+            # Client went away or the stream ended: drop any unfinished work
+            for task in list(tasks) + list(contexts.values()):
+                task.cancel()
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+def get_spending_analytics():
+    global spending_analytics
+    if spending_analytics is None:
+        from app.analytics.spending import SpendingAnalytics
+        spending_analytics = SpendingAnalytics()
+    return spending_analytics
 
 async def get_context_for_intent(intent_tag: str, username: str = None) -> str:
+    if not username or intent_tag not in USER_CONTEXT_INTENTS:
+        return await build_context_for_intent(intent_tag, username)
+    
+    context = await context_cache.get(username, intent_tag)
+    if context is None:
+        version = await get_account_version(username)
+        context = await build_context_for_intent(intent_tag, username)
+        await context_cache.set(username, intent_tag, version, context)
+    return context
+
+async def build_context_for_intent(intent_tag: str, username: str = None) -> str:
     if intent_tag == "account_balance":
         if not username:
             return "Account information is only available for authenticated users."
@@ -61,11 +239,22 @@ async def get_context_for_intent(intent_tag: str, username: str = None) -> str:
         else:
             return "No account information available."
             
+    elif intent_tag == "spending_analysis" and username:
+        # NumPy is only imported once spending analysis is first asked for
+        from app.analytics.spending import format_summary, summarize
+        
+        frame = await get_spending_analytics().get_frame(username)
+        if len(frame):
+            summary = await offload("cpu", summarize, frame)
+            return f"Spending Insights for {username}:\n{format_summary(summary)}"
+        else:
+            return "No recent transactions found for this user."
+            
     elif intent_tag in ["transaction_history", "spending_analysis"]:
         if username:
             transactions = await get_recent_transactions(username)
             if transactions:
-                trans_info = "\n".join([f"{t['transaction_date'].split()[0]} - {t['description']} - ${t['amount']:.2f} ({t['transaction_type']})" for t in transactions])
+                trans_info = "\n".join([f"{t['transaction_date']:%Y-%m-%d} - {t['description']} - ${t['amount']:.2f} ({t['transaction_type']})" for t in transactions])
                 return f"Recent Transactions for {username}:\n{trans_info}"
             else:
                 return "No recent transactions found for this user."
@@ -73,7 +262,7 @@ async def get_context_for_intent(intent_tag: str, username: str = None) -> str:
             # For anonymous users, return all recent transactions in the system
             transactions = await get_all_recent_transactions(5)
             if transactions:
-                trans_info = "\n".join([f"{t['transaction_date'].split()[0]} - {t['username']} - {t['description']} - ${t['amount']:.2f} ({t['transaction_type']})" for t in transactions])
+                trans_info = "\n".join([f"{t['transaction_date']:%Y-%m-%d} - {t['username']} - {t['description']} - ${t['amount']:.2f} ({t['transaction_type']})" for t in transactions])
                 return f"Recent Transactions in the system:\n{trans_info}"
             else:
                 return "No recent transactions found in the system."
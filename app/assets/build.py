@@ -0,0 +1,166 @@
+"""Build fingerprinted, precompressed static assets
+
+Usage:
+    python -m app.assets.build [--prune [--max-age 86400]]
+
+Copies every file under app/static to app/static/dist with a content hash
+in its name, writes .gz and .br variants of text assets next to it, and
+records the logical-to-fingerprinted mapping in dist/manifest.json.
+
+Files from earlier builds are kept, since pages rendered before a rebuild
+still reference them; --prune removes the ones that have been out of the
+manifest for longer than --max-age seconds.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = "app/static"
+DIST_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".svg", ".html", ".json", ".txt")
+VARIANT_SUFFIXES = (".gz", ".br")
+PRUNE_MAX_AGE = 86400
+
+
+def _write_atomic(path: str, content: bytes) -> None:
+    # Running servers never see a partly written file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _read_manifest(dist_dir: str) -> Dict[str, str]:
+    try:
+        with open(os.path.join(dist_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _with_variants(static_dir: str, fingerprinted: str) -> List[str]:
+    target = os.path.join(static_dir, fingerprinted)
+    return [target] + [target + suffix for suffix in VARIANT_SUFFIXES]
+
+
+def build_assets(static_dir: str = STATIC_DIR) -> Dict[str, str]:
+    """Build static_dir/dist from the files in static_dir
+
+    Fingerprinted names change with the content, so files already present
+    are left alone and the manifest is replaced last; servers pick it up
+    without ever seeing a missing asset.
+
+    Args:
+        static_dir: The directory served under /static
+
+    Returns:
+        Manifest mapping paths relative to static_dir to their fingerprinted paths
+    """
+    # Imported here: the server imports this module for its constants and
+    # never needs brotli
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    dist_dir = os.path.join(static_dir, DIST_DIR)
+    previous = _read_manifest(dist_dir)
+
+    if brotli is None:
+        logger.warning("brotli is not installed, only gzip variants will be built")
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != dist_dir)
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            logical = os.path.relpath(source, static_dir).replace(os.sep, "/")
+
+            with open(source, "rb") as f:
+                content = f.read()
+
+            stem, ext = os.path.splitext(logical)
+            fingerprinted = f"{DIST_DIR}/{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+            target = os.path.join(static_dir, fingerprinted)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+
+            # Variants first: a server only looks for them once the
+            # original exists
+            if ext in COMPRESSIBLE_EXTENSIONS:
+                if not os.path.exists(target + ".gz"):
+                    # mtime=0 keeps the gzip output identical across builds
+                    _write_atomic(target + ".gz", gzip.compress(content, compresslevel=9, mtime=0))
+                if brotli is not None and not os.path.exists(target + ".br"):
+                    _write_atomic(target + ".br", brotli.compress(content, quality=11))
+            if not os.path.exists(target):
+                _write_atomic(target, content)
+
+            manifest[logical] = fingerprinted
+
+    # Files leaving the manifest are stamped now, so pruning measures
+    # their age from this build rather than from the one that wrote them
+    current = set(manifest.values())
+    for fingerprinted in set(previous.values()) - current:
+        for path in _with_variants(static_dir, fingerprinted):
+            if os.path.exists(path):
+                os.utime(path)
+
+    os.makedirs(dist_dir, exist_ok=True)
+    _write_atomic(
+        os.path.join(dist_dir, MANIFEST_NAME),
+        json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8")
+    )
+
+    return manifest
+
+
+def prune_assets(static_dir: str = STATIC_DIR, max_age: float = PRUNE_MAX_AGE) -> List[str]:
+    """Remove files of earlier builds that the manifest dropped long enough ago
+
+    Args:
+        static_dir: The directory served under /static
+        max_age: Seconds a dropped file is kept for pages rendered before the build
+
+    Returns:
+        Paths of the removed files, relative to static_dir
+    """
+    dist_dir = os.path.join(static_dir, DIST_DIR)
+    keep = {
+        path
+        for fingerprinted in _read_manifest(dist_dir).values()
+        for path in _with_variants(static_dir, fingerprinted)
+    }
+    keep.add(os.path.join(dist_dir, MANIFEST_NAME))
+
+    cutoff = time.time() - max_age
+    removed = []
+    for root, _, files in os.walk(dist_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            if path in keep or os.path.getmtime(path) > cutoff:
+                continue
+            os.remove(path)
+            removed.append(os.path.relpath(path, static_dir).replace(os.sep, "/"))
+    return sorted(removed)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--prune", action="store_true", help="remove dropped files instead of building")
+    parser.add_argument("--max-age", type=float, default=PRUNE_MAX_AGE)
+    args = parser.parse_args()
+    if args.prune:
+        for path in prune_assets(max_age=args.max_age):
+            print(f"removed {path}")
+    else:
+        for logical, fingerprinted in build_assets().items():
+            print(f"{logical} -> {fingerprinted}")
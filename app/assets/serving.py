@@ -0,0 +1,180 @@
+import gzip
+import hashlib
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+from fastapi.templating import Jinja2Templates
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+from app.assets.build import DIST_DIR, MANIFEST_NAME, STATIC_DIR
+
+STATIC_URL = "/static"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Ask browsers to revalidate (cheaply, via ETag) on every use
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Preferred first
+PRECOMPRESSED_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+# static_dir -> (manifest_mtime, manifest)
+_manifests: Dict[str, Tuple[Optional[Tuple[int, int]], Dict[str, str]]] = {}
+
+
+def manifest_mtime(static_dir: str = STATIC_DIR) -> Optional[Tuple[int, int]]:
+    """Identifies the current manifest file, None if assets are not built
+
+    Builds replace the manifest rather than rewriting it, so the inode
+    changes even if two builds land within the timestamp resolution.
+    """
+    try:
+        stat = os.stat(os.path.join(static_dir, DIST_DIR, MANIFEST_NAME))
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def load_manifest(static_dir: str = STATIC_DIR) -> Dict[str, str]:
+    """The asset manifest written by app.assets.build, empty if assets are not built
+
+    Reloaded when a build replaces the manifest.
+    """
+    mtime = manifest_mtime(static_dir)
+    cached = _manifests.get(static_dir)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    try:
+        with open(os.path.join(static_dir, DIST_DIR, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        manifest = {}
+    _manifests[static_dir] = (mtime, manifest)
+    return manifest
+
+
+def asset_url(path: str) -> str:
+    """URL of a static asset, fingerprinted when the assets have been built"""
+    return f"{STATIC_URL}/{load_manifest().get(path, path)}"
+
+
+def _quality(params: str) -> float:
+    for param in params.split(";"):
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "q":
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def accepts_encoding(accept_encoding: str, encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows encoding
+
+    An entry naming the encoding overrides "*" wherever it appears, so
+    "*;q=0, gzip" accepts gzip and "gzip;q=0, *" does not.
+    """
+    wildcard = None
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if name == encoding:
+            return _quality(params) > 0
+        if name == "*":
+            wildcard = _quality(params)
+    return wildcard is not None and wildcard > 0
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves precompressed variants of fingerprinted assets
+
+    Files under dist/ are named by content hash, so they are served with an
+    immutable Cache-Control and, when the client accepts it, from their .br
+    or .gz sibling. Other files, and the manifest, which keeps its name
+    across builds, are served as usual but must be revalidated.
+    """
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if not path.startswith(f"{DIST_DIR}/") or path == f"{DIST_DIR}/{MANIFEST_NAME}":
+            response = await super().get_response(path, scope)
+            response.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+            return response
+
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        response = None
+        for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+            if not accepts_encoding(accept_encoding, encoding):
+                continue
+            try:
+                response = await super().get_response(path + suffix, scope)
+            except HTTPException:
+                continue
+            # The media type is guessed from the original extension
+            response.headers["Content-Encoding"] = encoding
+            break
+
+        if response is None:
+            response = await super().get_response(path, scope)
+
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+
+class PageCache:
+    """Pages rendered once and served from memory with ETag validation
+
+    Only for templates without per-request data. Each page is kept as plain
+    and gzip-compressed bytes, each with an ETag derived from the content;
+    the gzip one carries a -gz suffix since a strong ETag must differ
+    between encodings. Pages are rendered again after an asset build
+    replaces the manifest, so they link the new fingerprinted files.
+    """
+
+    def __init__(self, templates: Jinja2Templates, static_dir: str = STATIC_DIR):
+        self.templates = templates
+        self.static_dir = static_dir
+        self._manifest_mtime = manifest_mtime(static_dir)
+        self._pages: Dict[str, Tuple[bytes, str, bytes, str]] = {}
+
+    def _render(self, name: str) -> Tuple[bytes, str, bytes, str]:
+        mtime = manifest_mtime(self.static_dir)
+        if mtime != self._manifest_mtime:
+            self._pages.clear()
+            self._manifest_mtime = mtime
+
+        page = self._pages.get(name)
+        if page is None:
+            body = self.templates.get_template(name).render().encode("utf-8")
+            digest = hashlib.sha256(body).hexdigest()[:16]
+            page = (body, f'"{digest}"', gzip.compress(body, mtime=0), f'"{digest}-gz"')
+            self._pages[name] = page
+        return page
+
+    def response(self, request: Request, name: str) -> Response:
+        body, etag, compressed, compressed_etag = self._render(name)
+        headers = {"Cache-Control": REVALIDATE_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+
+        if accepts_encoding(request.headers.get("accept-encoding", ""), "gzip"):
+            body, etag = compressed, compressed_etag
+            headers["Content-Encoding"] = "gzip"
+        headers["ETag"] = etag
+
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            headers.pop("Content-Encoding", None)
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="text/html", headers=headers)
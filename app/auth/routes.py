@@ -9,12 +9,14 @@ from app.auth.jwt import (
     fake_users_db, 
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from app.executors.pool import offload
 
 router = APIRouter()
 
 @router.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(fake_users_db, form_data.username, form_data.password)
+    # bcrypt verification is deliberately slow; keep it off the event loop
+    user = await offload("auth", authenticate_user, fake_users_db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -0,0 +1,371 @@
+import abc
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from app.executors.pool import offload
+
+# "memory" keeps each worker's cache private; "sqlite" shares one WAL-mode
+# database file between every worker process on the host.
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")
+CACHE_PATH = os.environ.get("CACHE_PATH", "data/cache.db")
+
+
+class Cache(abc.ABC):
+    """Interface shared by the cache backends
+
+    Values must be JSON-serializable. None is never stored, so a compute
+    function can return None to signal a result that should not be cached.
+    """
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Any:
+        """Get a value, None if it is missing or expired"""
+
+    @abc.abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value, expiring after ttl seconds if given"""
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove a value if present"""
+
+    @abc.abstractmethod
+    def replace(self, key: str, expected: Any, value: Any, ttl: Optional[float] = None) -> bool:
+        """Store a value, or delete the key if value is None, only if the
+        current value equals expected (None meaning missing)
+
+        Returns:
+            True if the value was stored, False if another write came first
+        """
+
+    @abc.abstractmethod
+    def incr(self, key: str) -> int:
+        """Atomically increment an integer counter, starting from 0"""
+
+    @abc.abstractmethod
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """Get a value, computing and storing it on a miss
+
+        Concurrent misses for the same key run compute only once; the other
+        callers wait for and return its result.
+        """
+
+    # Variants for use on the event loop. Backends whose operations block on
+    # I/O run them on the "io" queue; in-memory ones run inline.
+    async def aget(self, key: str) -> Any:
+        return self.get(key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.set(key, value, ttl)
+
+    async def adelete(self, key: str) -> None:
+        self.delete(key)
+
+    async def areplace(self, key: str, expected: Any, value: Any, ttl: Optional[float] = None) -> bool:
+        return self.replace(key, expected, value, ttl)
+
+    async def aincr(self, key: str) -> int:
+        return self.incr(key)
+
+
+class MemoryCache(Cache):
+    """In-process LRU cache with TTL"""
+
+    def __init__(self, max_entries: Optional[int] = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            return self._get(key)
+
+    def _get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        if value is None:
+            return
+        with self._lock:
+            self._set(key, value, ttl)
+
+    def _set(self, key: str, value: Any, ttl: Optional[float]) -> None:
+        self._entries[key] = (value, time.time() + ttl if ttl else None)
+        self._entries.move_to_end(key)
+        if self.max_entries is not None:
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def replace(self, key: str, expected: Any, value: Any, ttl: Optional[float] = None) -> bool:
+        with self._lock:
+            if self._get(key) != expected:
+                return False
+            if value is None:
+                self._entries.pop(key, None)
+            else:
+                self._set(key, value, ttl)
+            return True
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value = (self._entries[key][0] if key in self._entries else 0) + 1
+            self._entries[key] = (value, None)
+            return value
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            value = self.get(key)
+            if value is None:
+                value = compute()
+                self.set(key, value, ttl)
+        with self._lock:
+            self._key_locks.pop(key, None)
+        return value
+
+
+class SQLiteCache(Cache):
+    """Host-wide cache stored in a WAL-mode SQLite database
+
+    Every worker process opening the same file sees the same entries.
+    Single-flight across processes uses a lease row: the caller that
+    inserts the lease computes the value, the others poll until it is
+    stored or the lease expires.
+    """
+
+    def __init__(self, namespace: str, path: str = CACHE_PATH, max_entries: Optional[int] = 10000,
+                 lease_timeout: float = 30.0, poll_interval: float = 0.05, evict_every: int = 64):
+        self.namespace = namespace
+        self.path = path
+        self.max_entries = max_entries
+        self.lease_timeout = lease_timeout
+        self.poll_interval = poll_interval
+        self.evict_every = evict_every
+        self._local = threading.local()
+        self._writes = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        db = self._connection()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute('''
+        CREATE TABLE IF NOT EXISTS cache (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            expires_at REAL,
+            stored_at REAL NOT NULL,
+            PRIMARY KEY (namespace, key)
+        ) WITHOUT ROWID
+        ''')
+        db.execute("CREATE INDEX IF NOT EXISTS idx_cache_stored ON cache (namespace, stored_at)")
+        db.execute('''
+        CREATE TABLE IF NOT EXISTS cache_leases (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (namespace, key)
+        ) WITHOUT ROWID
+        ''')
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, key: str) -> Any:
+        row = self._connection().execute(
+            "SELECT value FROM cache WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (self.namespace, key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        if value is None:
+            return
+        now = time.time()
+        self._connection().execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at, stored_at) VALUES (?, ?, ?, ?, ?)",
+            (self.namespace, key, json.dumps(value), now + ttl if ttl else None, now)
+        )
+        self._writes += 1
+        if self._writes % self.evict_every == 0:
+            self._evict()
+
+    def delete(self, key: str) -> None:
+        self._connection().execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    def replace(self, key: str, expected: Any, value: Any, ttl: Optional[float] = None) -> bool:
+        db = self._connection()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT value FROM cache WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (self.namespace, key, now)
+            ).fetchone()
+            if (json.loads(row[0]) if row else None) != expected:
+                db.execute("ROLLBACK")
+                return False
+            if value is None:
+                db.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+            else:
+                db.execute(
+                    "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at, stored_at) VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, key, json.dumps(value), now + ttl if ttl else None, now)
+                )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        self._writes += 1
+        if self._writes % self.evict_every == 0:
+            self._evict()
+        return True
+
+    def incr(self, key: str) -> int:
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute(
+                "INSERT INTO cache (namespace, key, value, expires_at, stored_at) VALUES (?, ?, '1', NULL, ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET value = CAST(value AS INTEGER) + 1",
+                (self.namespace, key, time.time())
+            )
+            value = db.execute(
+                "SELECT value FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+            ).fetchone()[0]
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return int(value)
+
+    async def aget(self, key: str) -> Any:
+        return await offload("io", self.get, key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await offload("io", self.set, key, value, ttl)
+
+    async def adelete(self, key: str) -> None:
+        await offload("io", self.delete, key)
+
+    async def areplace(self, key: str, expected: Any, value: Any, ttl: Optional[float] = None) -> bool:
+        return await offload("io", self.replace, key, expected, value, ttl)
+
+    async def aincr(self, key: str) -> int:
+        return await offload("io", self.incr, key)
+
+    def _evict(self) -> None:
+        # Amortized over evict_every writes: drop expired rows, then the
+        # oldest rows beyond max_entries.
+        db = self._connection()
+        db.execute(
+            "DELETE FROM cache WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+            (self.namespace, time.time())
+        )
+        if self.max_entries is None:
+            return
+        count = db.execute("SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)).fetchone()[0]
+        if count > self.max_entries:
+            db.execute(
+                "DELETE FROM cache WHERE namespace = ? AND key IN ("
+                "SELECT key FROM cache WHERE namespace = ? ORDER BY stored_at LIMIT ?)",
+                (self.namespace, self.namespace, count - self.max_entries)
+            )
+
+    def _acquire_lease(self, key: str, owner: str) -> bool:
+        db = self._connection()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute(
+                "DELETE FROM cache_leases WHERE namespace = ? AND key = ? AND expires_at <= ?",
+                (self.namespace, key, now)
+            )
+            cursor = db.execute(
+                "INSERT OR IGNORE INTO cache_leases (namespace, key, owner, expires_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, key, owner, now + self.lease_timeout)
+            )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return cursor.rowcount == 1
+
+    def _release_lease(self, key: str, owner: str) -> None:
+        self._connection().execute(
+            "DELETE FROM cache_leases WHERE namespace = ? AND key = ? AND owner = ?",
+            (self.namespace, key, owner)
+        )
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        owner = uuid.uuid4().hex
+        while True:
+            if self._acquire_lease(key, owner):
+                try:
+                    value = self.get(key)
+                    if value is None:
+                        value = compute()
+                        self.set(key, value, ttl)
+                    return value
+                finally:
+                    self._release_lease(key, owner)
+
+            # Another caller holds the lease; wait for its result. If it dies
+            # the lease expires and the next loop takes it over.
+            time.sleep(self.poll_interval)
+            value = self.get(key)
+            if value is not None:
+                return value
+
+
+def create_cache(namespace: str, max_entries: Optional[int] = 1024) -> Cache:
+    """Create a cache for one namespace using the configured backend
+
+    Args:
+        namespace: Keeps keys of different caches apart in a shared backend
+        max_entries: Size bound for eviction, or None for unbounded
+
+    Returns:
+        A MemoryCache or SQLiteCache depending on CACHE_BACKEND
+    """
+    if CACHE_BACKEND == "sqlite":
+        return SQLiteCache(namespace, max_entries=max_entries)
+    if CACHE_BACKEND == "memory":
+        return MemoryCache(max_entries=max_entries)
+    raise ValueError(f"Unknown CACHE_BACKEND: {CACHE_BACKEND}")
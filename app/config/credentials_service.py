@@ -1,5 +1,4 @@
 import os
-import requests
 
 class CredentialsService:
     """Service for fetching Azure OpenAI credentials from a server"""
@@ -19,6 +18,8 @@ class CredentialsService:
         
     def fetch_credentials(self):
         """Fetch credentials from the server"""
+        import requests
+        
         try:
             response = requests.get(self.server_url, timeout=10)
             response.raise_for_status()
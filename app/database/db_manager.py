@@ -1,17 +1,188 @@
 import aiosqlite
 import os
+import sqlite3
 import json
 import datetime
+import logging
+from decimal import Decimal, ROUND_HALF_UP
 from typing import List, Dict, Optional, Any, Union
 
+logger = logging.getLogger(__name__)
+
 DATABASE_PATH = os.environ.get("DATABASE_PATH", "data/financial_data.db")
 
+# Stored in PRAGMA user_version once the schema is created, migrated and
+# seeded, so a matching version lets startup skip all of those checks.
+#   0: nothing recorded yet (a fresh database, or an untouched legacy one
+#      with REAL amounts and text TIMESTAMP dates)
+#   1: legacy tables expanded with the compact columns below; converting
+#      the rows and dropping the legacy columns is pending, see
+#      app.database.migrate
+#   2: integer cents and integer epoch-second timestamps
+#   3: per-account write versions (user_accounts.version)
+SCHEMA_VERSION = 3
+MIGRATING_VERSION = 1
+MIGRATION_CHUNK_SIZE = 500
+
+# Table definitions, also used by the migration to rebuild legacy tables
+USER_ACCOUNTS_TABLE = '''
+CREATE TABLE IF NOT EXISTS {name} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    account_number TEXT UNIQUE NOT NULL,
+    balance_cents INTEGER NOT NULL,
+    account_type TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    version INTEGER NOT NULL DEFAULT 0
+)
+'''
+
+TRANSACTIONS_TABLE = '''
+CREATE TABLE IF NOT EXISTS {name} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account_id INTEGER NOT NULL,
+    transaction_type TEXT NOT NULL,
+    amount_cents INTEGER NOT NULL,
+    description TEXT,
+    category TEXT,
+    transaction_ts INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+    FOREIGN KEY (account_id) REFERENCES user_accounts (id)
+)
+'''
+
+TRANSACTIONS_INDEX = "CREATE INDEX IF NOT EXISTS idx_transactions_account_ts ON transactions (account_id, transaction_ts)"
+
+# Every write to an account or its transactions bumps user_accounts.version
+# in the same transaction, whichever code makes it, so anything derived from
+# an account's rows can be validated by comparing versions instead of
+# re-querying. Triggers are dropped with their table, so the migration's
+# rebuild recreates them.
+VERSION_TRIGGERS = (
+    '''
+    CREATE TRIGGER IF NOT EXISTS transactions_insert_version AFTER INSERT ON transactions
+    BEGIN
+        UPDATE user_accounts SET version = version + 1 WHERE id = NEW.account_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS transactions_update_version AFTER UPDATE ON transactions
+    BEGIN
+        UPDATE user_accounts SET version = version + 1 WHERE id IN (OLD.account_id, NEW.account_id);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS transactions_delete_version AFTER DELETE ON transactions
+    BEGIN
+        UPDATE user_accounts SET version = version + 1 WHERE id = OLD.account_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS user_accounts_update_version AFTER UPDATE ON user_accounts
+    WHEN NEW.version = OLD.version
+    BEGIN
+        UPDATE user_accounts SET version = version + 1 WHERE id = NEW.id;
+    END
+    ''',
+)
+
+# Legacy values converted to the compact representation. Legacy dates are
+# local time (see _to_epoch), hence the 'utc' modifier.
+LEGACY_BALANCE_CENTS = "CAST(ROUND(balance * 100) AS INTEGER)"
+LEGACY_AMOUNT_CENTS = "CAST(ROUND(amount * 100) AS INTEGER)"
+LEGACY_TRANSACTION_TS = "CAST(strftime('%s', transaction_date, 'utc') AS INTEGER)"
+
+async def get_account_version(username: str) -> int:
+    """Get the current write version of a user's account, 0 if there is none"""
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with db.execute("SELECT version FROM user_accounts WHERE username = ?", (username,)) as cursor:
+            row = await cursor.fetchone()
+            return row[0] if row else 0
+
+# Money is stored as integer cents and dates as integer epoch seconds.
+# Callers keep working with dollars and datetimes; conversion happens here.
+# Naive datetimes are local time, as the legacy TIMESTAMP strings were
+# (written from datetime.now()), so seeded, new and migrated rows agree.
+def _to_cents(amount: Union[float, int, str, Decimal]) -> int:
+    return int((Decimal(str(amount)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+def _from_cents(cents: Optional[int]) -> float:
+    return cents / 100 if cents is not None else 0.0
+
+def _to_epoch(value: datetime.datetime) -> int:
+    return int(value.timestamp())
+
+def _from_epoch(ts: Optional[int]) -> Optional[datetime.datetime]:
+    return datetime.datetime.fromtimestamp(ts) if ts is not None else None
+
+def _account_from_row(row) -> Dict:
+    account = dict(row)
+    account['balance'] = _from_cents(account.pop('balance_cents'))
+    return account
+
+def _transaction_from_row(row) -> Dict:
+    transaction = dict(row)
+    transaction['amount'] = _from_cents(transaction.pop('amount_cents'))
+    transaction['transaction_date'] = _from_epoch(transaction.pop('transaction_ts'))
+    return transaction
+
+def _storage_columns(migrating: bool) -> Dict[str, str]:
+    """SQL expressions for the compact columns
+    
+    While a migration is pending some rows are not converted yet, so the
+    expressions fall back to the legacy columns. Column names are distinct
+    across user_accounts and transactions, so they work in joins unqualified.
+    """
+    if not migrating:
+        return {name: name for name in ("balance_cents", "amount_cents", "transaction_ts")}
+    return {
+        "balance_cents": f"COALESCE(balance_cents, {LEGACY_BALANCE_CENTS})",
+        "amount_cents": f"COALESCE(amount_cents, {LEGACY_AMOUNT_CENTS})",
+        "transaction_ts": f"COALESCE(transaction_ts, {LEGACY_TRANSACTION_TS})",
+    }
+
+async def _begin(db, immediate: bool = False) -> bool:
+    """Start a transaction and tell whether it sees a pending migration
+    
+    The migration swaps the schema and the version in one transaction, so
+    reading the version in the same transaction as the queries that follow
+    keeps them consistent with each other.
+    """
+    await db.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    async with db.execute("PRAGMA user_version") as cursor:
+        return (await cursor.fetchone())[0] == MIGRATING_VERSION
+
+async def get_schema_version() -> int:
+    """Get the schema version stored in the database, 0 if there is none"""
+    if not os.path.exists(DATABASE_PATH):
+        return 0
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with db.execute("PRAGMA user_version") as cursor:
+            return (await cursor.fetchone())[0]
+
+async def mark_setup_complete() -> bool:
+    """Record SCHEMA_VERSION, unless a storage migration is still pending
+    
+    Returns:
+        True if the version was recorded
+    """
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        if await _begin(db, immediate=True):
+            return False
+        await db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        await db.commit()
+        return True
+
 async def init_db():
     # Create directory if it doesn't exist and if path contains a directory
     if os.path.dirname(DATABASE_PATH):
         os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
     
     async with aiosqlite.connect(DATABASE_PATH) as db:
+        # Workers start concurrently against the same file. Taking the write
+        # lock before looking at the schema serializes setup, so each worker
+        # sees the finished work of the ones before it.
+        await db.execute("BEGIN IMMEDIATE")
+        
         # Main client data table
         await db.execute('''
         CREATE TABLE IF NOT EXISTS client_data (
@@ -24,33 +195,59 @@ async def init_db():
         ''')
         
         # User accounts table
-        await db.execute('''
-        CREATE TABLE IF NOT EXISTS user_accounts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            account_number TEXT UNIQUE NOT NULL,
-            balance REAL NOT NULL,
-            account_type TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
+        await db.execute(USER_ACCOUNTS_TABLE.format(name="user_accounts"))
         
         # Transactions table
-        await db.execute('''
-        CREATE TABLE IF NOT EXISTS transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            account_id INTEGER NOT NULL,
-            transaction_type TEXT NOT NULL,
-            amount REAL NOT NULL,
-            description TEXT,
-            category TEXT,
-            transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (account_id) REFERENCES user_accounts (id)
-        )
-        ''')
+        await db.execute(TRANSACTIONS_TABLE.format(name="transactions"))
+        
+        # Added in place on databases from before write versions; the
+        # column then matches a fresh table's
+        if "version" not in await _table_columns(db, "user_accounts"):
+            await db.execute("ALTER TABLE user_accounts ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        for trigger in VERSION_TRIGGERS:
+            await db.execute(trigger)
         
+        if await expand_legacy_storage(db):
+            logger.warning(
+                "Legacy storage found; rows are converted on read until "
+                "`python -m app.database.migrate` has been run"
+            )
+        
+        await db.execute(TRANSACTIONS_INDEX)
         await db.commit()
 
+async def _table_columns(db, table: str) -> List[str]:
+    async with db.execute(f"PRAGMA table_info({table})") as cursor:
+        return [row[1] for row in await cursor.fetchall()]
+
+async def expand_legacy_storage(db) -> bool:
+    """Add the compact columns to legacy tables (the expand step of the migration)
+    
+    Only changes the schema, so it is quick enough for startup. The rows are
+    converted by app.database.migrate while the app keeps serving; until
+    then reads fall back to the legacy columns and writes fill in both.
+    Must run inside the caller's write transaction.
+    
+    Args:
+        db: An open aiosqlite connection
+        
+    Returns:
+        True if the database has legacy columns, i.e. a migration is pending
+    """
+    account_columns = await _table_columns(db, "user_accounts")
+    transaction_columns = await _table_columns(db, "transactions")
+    if "balance" not in account_columns and "amount" not in transaction_columns:
+        return False
+    
+    if "balance_cents" not in account_columns:
+        await db.execute("ALTER TABLE user_accounts ADD COLUMN balance_cents INTEGER")
+    if "amount_cents" not in transaction_columns:
+        await db.execute("ALTER TABLE transactions ADD COLUMN amount_cents INTEGER")
+    if "transaction_ts" not in transaction_columns:
+        await db.execute("ALTER TABLE transactions ADD COLUMN transaction_ts INTEGER")
+    await db.execute(f"PRAGMA user_version = {MIGRATING_VERSION}")
+    return True
+
 async def populate_sample_data():
     async with aiosqlite.connect(DATABASE_PATH) as db:
         # Check if data already exists in client_data
@@ -88,8 +285,8 @@ async def populate_sample_data():
         ]
         
         await db.executemany(
-            "INSERT INTO user_accounts (username, account_number, balance, account_type) VALUES (?, ?, ?, ?)",
-            sample_accounts
+            "INSERT INTO user_accounts (username, account_number, balance_cents, account_type) VALUES (?, ?, ?, ?)",
+            [(username, number, _to_cents(balance), account_type) for username, number, balance, account_type in sample_accounts]
         )
         
         # Get account IDs for transactions
@@ -149,8 +346,12 @@ async def populate_sample_data():
         
         if sample_transactions:
             await db.executemany(
-                "INSERT INTO transactions (account_id, transaction_type, amount, description, category, transaction_date) VALUES (?, ?, ?, ?, ?, ?)",
-                sample_transactions
+                "INSERT INTO transactions (account_id, transaction_type, amount_cents, description, category, transaction_ts) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (account_id, transaction_type, _to_cents(amount), description, category,
+                     _to_epoch(datetime.datetime.strptime(date, '%Y-%m-%d %H:%M:%S')))
+                    for account_id, transaction_type, amount, description, category, date in sample_transactions
+                ]
             )
         
         await db.commit()
@@ -191,6 +392,93 @@ async def add_client_data(query_tag: str, info: str) -> int:
         await db.commit()
         return cursor.lastrowid
 
+async def _get_account_username(db, account_id: int) -> Optional[str]:
+    async with db.execute("SELECT username FROM user_accounts WHERE id = ?", (account_id,)) as cursor:
+        row = await cursor.fetchone()
+        return row[0] if row else None
+
+async def add_transaction(account_id: int, transaction_type: str, amount: float,
+                          description: Optional[str] = None, category: Optional[str] = None,
+                          transaction_date: Optional[datetime.datetime] = None) -> int:
+    """Record a transaction and apply it to the account balance
+    
+    Args:
+        account_id: The account the transaction belongs to
+        transaction_type: Either 'debit' or 'credit'
+        amount: The (positive) transaction amount
+        description: Optional free-text description
+        category: Optional spending category
+        transaction_date: When the transaction happened, defaults to now
+        
+    Returns:
+        ID of the newly inserted transaction
+    """
+    if transaction_type not in ('debit', 'credit'):
+        raise ValueError(f"Invalid transaction type: {transaction_type}")
+    
+    amount_cents = _to_cents(amount)
+    transaction_ts = _to_epoch(transaction_date or datetime.datetime.now())
+    delta = amount_cents if transaction_type == 'credit' else -amount_cents
+    
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        migrating = await _begin(db, immediate=True)
+        columns = _storage_columns(migrating)
+        
+        username = await _get_account_username(db, account_id)
+        if username is None:
+            raise ValueError(f"Unknown account: {account_id}")
+        
+        if migrating:
+            # The legacy columns stay NOT NULL until the migration drops them
+            cursor = await db.execute(
+                "INSERT INTO transactions (account_id, transaction_type, amount_cents, description, category, transaction_ts, amount, transaction_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (account_id, transaction_type, amount_cents, description, category, transaction_ts,
+                 _from_cents(amount_cents), _from_epoch(transaction_ts).strftime('%Y-%m-%d %H:%M:%S'))
+            )
+            await db.execute(
+                f"UPDATE user_accounts SET balance_cents = {columns['balance_cents']} + ?, balance = balance + ? WHERE id = ?",
+                (delta, _from_cents(delta), account_id)
+            )
+        else:
+            cursor = await db.execute(
+                "INSERT INTO transactions (account_id, transaction_type, amount_cents, description, category, transaction_ts) VALUES (?, ?, ?, ?, ?, ?)",
+                (account_id, transaction_type, amount_cents, description, category, transaction_ts)
+            )
+            await db.execute(
+                "UPDATE user_accounts SET balance_cents = balance_cents + ? WHERE id = ?",
+                (delta, account_id)
+            )
+        await db.commit()
+        return cursor.lastrowid
+
+async def update_account_balance(account_id: int, balance: float) -> None:
+    """Set the balance of an account
+    
+    Args:
+        account_id: The account to update
+        balance: The new balance
+    """
+    balance_cents = _to_cents(balance)
+    
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        migrating = await _begin(db, immediate=True)
+        
+        username = await _get_account_username(db, account_id)
+        if username is None:
+            raise ValueError(f"Unknown account: {account_id}")
+        
+        if migrating:
+            await db.execute(
+                "UPDATE user_accounts SET balance_cents = ?, balance = ? WHERE id = ?",
+                (balance_cents, _from_cents(balance_cents), account_id)
+            )
+        else:
+            await db.execute(
+                "UPDATE user_accounts SET balance_cents = ? WHERE id = ?",
+                (balance_cents, account_id)
+            )
+        await db.commit()
+
 async def get_account_balance(username: str, account_type: Optional[str] = None) -> List[Dict]:
     """Get account balance information for a user
     
@@ -203,8 +491,9 @@ async def get_account_balance(username: str, account_type: Optional[str] = None)
     """
     async with aiosqlite.connect(DATABASE_PATH) as db:
         db.row_factory = aiosqlite.Row
+        columns = _storage_columns(await _begin(db))
         
-        query = "SELECT id, account_number, balance, account_type FROM user_accounts WHERE username = ?"
+        query = f"SELECT id, account_number, {columns['balance_cents']} AS balance_cents, account_type FROM user_accounts WHERE username = ?"
         params = [username]
         
         if account_type:
@@ -213,7 +502,7 @@ async def get_account_balance(username: str, account_type: Optional[str] = None)
             
         async with db.execute(query, params) as cursor:
             rows = await cursor.fetchall()
-            return [dict(row) for row in rows]
+            return [_account_from_row(row) for row in rows]
 
 async def get_recent_transactions(username: str, limit: int = 10) -> List[Dict]:
     """Get recent transactions for a user across all their accounts
@@ -227,19 +516,56 @@ async def get_recent_transactions(username: str, limit: int = 10) -> List[Dict]:
     """
     async with aiosqlite.connect(DATABASE_PATH) as db:
         db.row_factory = aiosqlite.Row
+        columns = _storage_columns(await _begin(db))
         
-        query = """
-        SELECT t.id, t.transaction_type, t.amount, t.description, t.category, t.transaction_date, a.account_type, a.account_number
+        query = f"""
+        SELECT t.id, t.transaction_type, {columns['amount_cents']} AS amount_cents, t.description, t.category,
+               {columns['transaction_ts']} AS transaction_ts, a.account_type, a.account_number
         FROM transactions t
         JOIN user_accounts a ON t.account_id = a.id
         WHERE a.username = ?
-        ORDER BY t.transaction_date DESC
+        ORDER BY {columns['transaction_ts']} DESC
         LIMIT ?
         """
         
         async with db.execute(query, (username, limit)) as cursor:
             rows = await cursor.fetchall()
-            return [dict(row) for row in rows]
+            return [_transaction_from_row(row) for row in rows]
+
+def read_transaction_columns(username: str, since: Optional[datetime.datetime] = None,
+                             database_path: Optional[str] = None) -> List[tuple]:
+    """Get a user's transactions as raw storage-format tuples, oldest first
+    
+    Unlike the other queries this skips row conversion and is synchronous,
+    for callers that load whole histories into columnar form in a worker
+    process.
+    
+    Args:
+        username: The username to get transactions for
+        since: Optional lower bound on the transaction date
+        database_path: The database to read, defaults to DATABASE_PATH as
+            seen by the calling process
+        
+    Returns:
+        List of (transaction_ts, amount_cents, transaction_type, category, description) tuples
+    """
+    conn = sqlite3.connect(database_path or DATABASE_PATH)
+    try:
+        conn.execute("BEGIN")
+        migrating = conn.execute("PRAGMA user_version").fetchone()[0] == MIGRATING_VERSION
+        columns = _storage_columns(migrating)
+        
+        query = f"""
+        SELECT {columns['transaction_ts']}, {columns['amount_cents']}, t.transaction_type, t.category, t.description
+        FROM transactions t
+        JOIN user_accounts a ON t.account_id = a.id
+        WHERE a.username = ? AND {columns['transaction_ts']} >= ?
+        ORDER BY {columns['transaction_ts']}
+        """
+        
+        return conn.execute(query, (username, _to_epoch(since) if since else 0)).fetchall()
+    finally:
+        conn.close()
 
 async def get_spending_analysis(username: str, days: int = 30) -> Dict[str, Any]:
     """Get spending analysis by category for a user
@@ -253,30 +579,31 @@ async def get_spending_analysis(username: str, days: int = 30) -> Dict[str, Any]
     """
     async with aiosqlite.connect(DATABASE_PATH) as db:
         db.row_factory = aiosqlite.Row
+        columns = _storage_columns(await _begin(db))
         
         # Calculate the date threshold
-        date_threshold = (datetime.datetime.now() - datetime.timedelta(days=days)).strftime('%Y-%m-%d')
+        date_threshold = _to_epoch(datetime.datetime.now() - datetime.timedelta(days=days))
         
         # Get total spending
-        total_query = """
-        SELECT SUM(t.amount) as total_spent
+        total_query = f"""
+        SELECT SUM({columns['amount_cents']}) as total_spent_cents
         FROM transactions t
         JOIN user_accounts a ON t.account_id = a.id
-        WHERE a.username = ? AND t.transaction_type = 'debit' AND t.transaction_date >= ?
+        WHERE a.username = ? AND t.transaction_type = 'debit' AND {columns['transaction_ts']} >= ?
         """
         
         async with db.execute(total_query, (username, date_threshold)) as cursor:
             total_row = await cursor.fetchone()
-            total_spent = total_row['total_spent'] if total_row and total_row['total_spent'] else 0
+            total_spent_cents = total_row['total_spent_cents'] if total_row and total_row['total_spent_cents'] else 0
         
         # Get spending by category
-        category_query = """
-        SELECT t.category, SUM(t.amount) as amount
+        category_query = f"""
+        SELECT t.category, SUM({columns['amount_cents']}) as total_cents
         FROM transactions t
         JOIN user_accounts a ON t.account_id = a.id
-        WHERE a.username = ? AND t.transaction_type = 'debit' AND t.transaction_date >= ?
+        WHERE a.username = ? AND t.transaction_type = 'debit' AND {columns['transaction_ts']} >= ?
         GROUP BY t.category
-        ORDER BY amount DESC
+        ORDER BY total_cents DESC
         """
         
         categories = []
@@ -284,12 +611,12 @@ async def get_spending_analysis(username: str, days: int = 30) -> Dict[str, Any]
             async for row in cursor:
                 categories.append({
                     'category': row['category'],
-                    'amount': row['amount'],
-                    'percentage': (row['amount'] / total_spent * 100) if total_spent > 0 else 0
+                    'amount': _from_cents(row['total_cents']),
+                    'percentage': (row['total_cents'] / total_spent_cents * 100) if total_spent_cents > 0 else 0
                 })
         
         return {
-            'total_spent': total_spent,
+            'total_spent': _from_cents(total_spent_cents),
             'period_days': days,
             'categories': categories,
             'analysis_date': datetime.datetime.now().strftime('%Y-%m-%d')
@@ -306,16 +633,17 @@ async def get_all_recent_transactions(limit: int = 10) -> List[Dict]:
     """
     async with aiosqlite.connect(DATABASE_PATH) as db:
         db.row_factory = aiosqlite.Row
+        columns = _storage_columns(await _begin(db))
         
-        query = """
-        SELECT t.id, t.transaction_type, t.amount, t.description, t.category, t.transaction_date, 
-               a.account_type, a.account_number, a.username
+        query = f"""
+        SELECT t.id, t.transaction_type, {columns['amount_cents']} AS amount_cents, t.description, t.category,
+               {columns['transaction_ts']} AS transaction_ts, a.account_type, a.account_number, a.username
         FROM transactions t
         JOIN user_accounts a ON t.account_id = a.id
-        ORDER BY t.transaction_date DESC
+        ORDER BY {columns['transaction_ts']} DESC
         LIMIT ?
         """
         
         async with db.execute(query, (limit,)) as cursor:
             rows = await cursor.fetchall()
-            return [dict(row) for row in rows]
+            return [_transaction_from_row(row) for row in rows]
@@ -0,0 +1,165 @@
+"""Finish migrating legacy storage to integer cents and epoch seconds
+
+Usage:
+    python -m app.database.migrate [--chunk-size 500] [--pause 0.05]
+
+Startup only runs the expand step: it adds the compact columns to legacy
+tables, after which the app reads through the legacy columns for rows not
+converted yet and writes both. This command does the rest while the app
+keeps serving:
+
+* backfill: converts the remaining rows, a chunk per short write transaction
+* contract: rebuilds both tables in the current schema (create, copy,
+  rename) in one transaction together with the schema version
+
+Interrupting it is safe; converted rows are skipped on the next run.
+"""
+import argparse
+import asyncio
+import logging
+
+import aiosqlite
+
+from app.database import db_manager
+from app.database.db_manager import (
+    MIGRATING_VERSION, MIGRATION_CHUNK_SIZE, SCHEMA_VERSION,
+    USER_ACCOUNTS_TABLE, TRANSACTIONS_TABLE, TRANSACTIONS_INDEX, VERSION_TRIGGERS,
+    LEGACY_BALANCE_CENTS, LEGACY_AMOUNT_CENTS, LEGACY_TRANSACTION_TS,
+    init_db
+)
+
+logger = logging.getLogger(__name__)
+
+# (table, assignments, condition selecting rows still to convert)
+BACKFILLS = (
+    ("user_accounts",
+     f"balance_cents = {LEGACY_BALANCE_CENTS}",
+     "balance_cents IS NULL"),
+    ("transactions",
+     f"amount_cents = COALESCE(amount_cents, {LEGACY_AMOUNT_CENTS}), "
+     f"transaction_ts = COALESCE(transaction_ts, {LEGACY_TRANSACTION_TS}, CAST(strftime('%s', 'now') AS INTEGER))",
+     "amount_cents IS NULL OR transaction_ts IS NULL"),
+)
+
+# Columns copied into the rebuilt tables
+USER_ACCOUNTS_COLUMNS = "id, username, account_number, balance_cents, account_type, created_at, version"
+TRANSACTIONS_COLUMNS = "id, account_id, transaction_type, amount_cents, description, category, transaction_ts"
+
+
+async def backfill(chunk_size: int = MIGRATION_CHUNK_SIZE, pause: float = 0.0) -> int:
+    """Convert legacy rows that have no compact values yet
+
+    Args:
+        chunk_size: Number of rows converted per write transaction
+        pause: Seconds to wait between chunks, leaving the write lock to the app
+
+    Returns:
+        Number of rows converted
+    """
+    converted = 0
+    async with aiosqlite.connect(db_manager.DATABASE_PATH) as db:
+        async with db.execute("PRAGMA user_version") as cursor:
+            if (await cursor.fetchone())[0] != MIGRATING_VERSION:
+                return 0
+
+        for table, assignments, pending in BACKFILLS:
+            while True:
+                await db.execute("BEGIN IMMEDIATE")
+                cursor = await db.execute(
+                    f"UPDATE {table} SET {assignments} WHERE id IN (SELECT id FROM {table} WHERE {pending} LIMIT ?)",
+                    (chunk_size,)
+                )
+                await db.commit()
+                converted += cursor.rowcount
+                if cursor.rowcount < chunk_size:
+                    break
+                await asyncio.sleep(pause)
+    return converted
+
+
+async def contract() -> bool:
+    """Rebuild the expanded tables without their legacy columns
+
+    Columns added by ALTER TABLE cannot be made NOT NULL or given a
+    DEFAULT, so instead of dropping the legacy columns the tables are
+    recreated from the same definitions as a fresh database and the rows
+    copied over. This holds the write lock for the length of the copy.
+
+    Returns:
+        True if the tables were rebuilt, False if no migration was pending
+
+    Raises:
+        RuntimeError: If rows are left to backfill
+    """
+    async with aiosqlite.connect(db_manager.DATABASE_PATH) as db:
+        # Parent and child tables are dropped and renamed one at a time
+        await db.execute("PRAGMA foreign_keys = OFF")
+        await db.execute("BEGIN IMMEDIATE")
+        async with db.execute("PRAGMA user_version") as cursor:
+            if (await cursor.fetchone())[0] != MIGRATING_VERSION:
+                return False
+
+        for table, _, pending in BACKFILLS:
+            async with db.execute(f"SELECT COUNT(*) FROM {table} WHERE {pending}") as cursor:
+                remaining = (await cursor.fetchone())[0]
+            if remaining:
+                raise RuntimeError(f"{remaining} rows of {table} are not backfilled yet")
+
+        async with db.execute("SELECT name, seq FROM sqlite_sequence") as cursor:
+            sequences = dict(await cursor.fetchall())
+
+        await db.execute(USER_ACCOUNTS_TABLE.format(name="user_accounts_compact"))
+        await db.execute(TRANSACTIONS_TABLE.format(name="transactions_compact"))
+        await db.execute(
+            f"INSERT INTO user_accounts_compact ({USER_ACCOUNTS_COLUMNS}) SELECT {USER_ACCOUNTS_COLUMNS} FROM user_accounts"
+        )
+        await db.execute(
+            f"INSERT INTO transactions_compact ({TRANSACTIONS_COLUMNS}) SELECT {TRANSACTIONS_COLUMNS} FROM transactions"
+        )
+        await db.execute("DROP TABLE transactions")
+        await db.execute("DROP TABLE user_accounts")
+        await db.execute("ALTER TABLE user_accounts_compact RENAME TO user_accounts")
+        await db.execute("ALTER TABLE transactions_compact RENAME TO transactions")
+        await db.execute(TRANSACTIONS_INDEX)
+        for trigger in VERSION_TRIGGERS:
+            await db.execute(trigger)
+
+        # Ids of deleted rows must not be handed out again
+        for table in ("user_accounts", "transactions"):
+            if table in sequences:
+                await db.execute(
+                    "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?",
+                    (sequences[table], table)
+                )
+
+        async with db.execute("PRAGMA foreign_key_check") as cursor:
+            if await cursor.fetchone():
+                raise RuntimeError("Rebuilt tables fail the foreign key check")
+
+        await db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        await db.commit()
+        return True
+
+
+async def migrate(chunk_size: int = MIGRATION_CHUNK_SIZE, pause: float = 0.0) -> bool:
+    """Run every remaining step of the migration
+
+    Returns:
+        True if a migration was pending and is now complete
+    """
+    await init_db()
+    converted = await backfill(chunk_size, pause)
+    logger.info(f"Backfilled {converted} rows")
+    return await contract()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunk-size", type=int, default=MIGRATION_CHUNK_SIZE)
+    parser.add_argument("--pause", type=float, default=0.05)
+    args = parser.parse_args()
+    if asyncio.run(migrate(args.chunk_size, args.pause)):
+        logger.info(f"Storage migrated to schema version {SCHEMA_VERSION}")
+    else:
+        logger.info("No migration pending")
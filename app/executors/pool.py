@@ -0,0 +1,152 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROCESS = "process"
+THREAD = "thread"
+
+CPU_COUNT = os.cpu_count() or 1
+
+# Named queues: (pool kind, max concurrent jobs). Process-pool queues take
+# CPU-bound work and need picklable, module-level callables and arguments;
+# thread-pool queues take blocking I/O.
+DEFAULT_QUEUES: Dict[str, Tuple[str, int]] = {
+    "cpu": (PROCESS, int(os.environ.get("EXECUTOR_CPU_CONCURRENCY", CPU_COUNT))),
+    "auth": (PROCESS, int(os.environ.get("EXECUTOR_AUTH_CONCURRENCY", max(1, CPU_COUNT // 2)))),
+    "llm": (THREAD, int(os.environ.get("EXECUTOR_LLM_CONCURRENCY", 16))),
+    "io": (THREAD, int(os.environ.get("EXECUTOR_IO_CONCURRENCY", 8))),
+}
+
+# Process workers must not be forked from the server process: a fork copies
+# its event loop, threads and open sqlite connections mid-use. forkserver
+# forks them from a clean single-threaded process instead.
+START_METHOD = os.environ.get(
+    "EXECUTOR_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+class WorkQueue:
+    """A named, concurrency-limited lane onto one of the shared pools"""
+
+    def __init__(self, name: str, kind: str, concurrency: int):
+        self.name = name
+        self.kind = kind
+        self.concurrency = concurrency
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    def metrics(self) -> Dict[str, Any]:
+        finished = self.completed + self.failed
+        return {
+            "kind": self.kind,
+            "concurrency": self.concurrency,
+            "depth": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait_ms": self.total_wait / finished * 1000 if finished else 0.0,
+            "max_wait_ms": self.max_wait * 1000,
+            "avg_run_ms": self.total_run / finished * 1000 if finished else 0.0,
+        }
+
+
+class ExecutorManager:
+    """Shared process and thread pools fronted by named work queues
+
+    Each queue caps how many of its jobs run at once, so one kind of work
+    cannot starve the pools for the others. Jobs beyond the cap wait on the
+    event loop, which is what the depth and wait-time metrics measure.
+    """
+
+    def __init__(self, queues: Dict[str, Tuple[str, int]] = None,
+                 process_workers: Optional[int] = None, thread_workers: Optional[int] = None):
+        queues = queues or DEFAULT_QUEUES
+        self.queues = {name: WorkQueue(name, kind, concurrency) for name, (kind, concurrency) in queues.items()}
+        self.process_workers = process_workers or int(os.environ.get("EXECUTOR_PROCESS_WORKERS", CPU_COUNT))
+        self.thread_workers = thread_workers or int(os.environ.get(
+            "EXECUTOR_THREAD_WORKERS",
+            sum(q.concurrency for q in self.queues.values() if q.kind == THREAD) or 1
+        ))
+        self._pools: Dict[str, Executor] = {}
+
+    def start(self) -> None:
+        """Create the pools; safe to call more than once"""
+        if self._pools:
+            return
+        self._pools[PROCESS] = ProcessPoolExecutor(
+            max_workers=self.process_workers,
+            mp_context=multiprocessing.get_context(START_METHOD)
+        )
+        self._pools[THREAD] = ThreadPoolExecutor(max_workers=self.thread_workers, thread_name_prefix="offload")
+        logger.info(f"Executors started: {self.process_workers} processes ({START_METHOD}), {self.thread_workers} threads")
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the pools, cancelling jobs that have not started"""
+        for pool in self._pools.values():
+            pool.shutdown(wait=wait, cancel_futures=True)
+        self._pools.clear()
+
+    async def run(self, queue_name: str, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on the named queue and return its result"""
+        queue = self.queues[queue_name]
+        self.start()
+
+        enqueued = time.perf_counter()
+        queue.waiting += 1
+        try:
+            await queue._semaphore.acquire()
+        finally:
+            queue.waiting -= 1
+
+        started = time.perf_counter()
+        wait = started - enqueued
+        queue.total_wait += wait
+        queue.max_wait = max(queue.max_wait, wait)
+        queue.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._pools[queue.kind], functools.partial(fn, *args, **kwargs))
+            queue.completed += 1
+            return result
+        except Exception:
+            queue.failed += 1
+            raise
+        finally:
+            queue.running -= 1
+            queue.total_run += time.perf_counter() - started
+            queue._semaphore.release()
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Per-queue depth, concurrency and timing statistics"""
+        return {name: queue.metrics() for name, queue in self.queues.items()}
+
+
+executor_manager = ExecutorManager()
+
+
+async def offload(queue_name: str, fn: Callable, *args, **kwargs) -> Any:
+    """Run blocking or CPU-heavy work off the event loop on a named queue
+
+    Args:
+        queue_name: One of the configured queues, e.g. "cpu", "auth", "llm" or "io"
+        fn: The callable to run; must be picklable for process-pool queues
+
+    Returns:
+        Whatever fn returns
+    """
+    return await executor_manager.run(queue_name, fn, *args, **kwargs)
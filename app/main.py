@@ -1,5 +1,4 @@
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.requests import Request
@@ -21,22 +20,52 @@ if not os.environ.get("ENGINE_WILCO_AI_URL"):
     os.environ["ENGINE_WILCO_AI_URL"] = "https://api.wilco.ai/credentials"
 
 from app.api.routes import router as api_router
+from app.api.admission import AdmissionControlMiddleware
 from app.auth.routes import router as auth_router
-from app.database.db_manager import init_db, populate_sample_data
+from app.database.db_manager import (
+    init_db, populate_sample_data, get_schema_version, mark_setup_complete, SCHEMA_VERSION
+)
+from app.executors.pool import executor_manager
+from app.assets.serving import PrecompressedStaticFiles, PageCache, asset_url
+from app.models.llm_service import load_llm_service, llm_service_ready
+
+# Fast start (the default) skips database setup when the stored schema
+# version is current and creates the LLM service in the background instead
+# of before serving. FAST_START=0 restores full setup on every boot.
+FAST_START = os.environ.get("FAST_START", "1") != "0"
 
 # Global variable to track application readiness
 app_ready = False
 startup_time = time.time()
+llm_warmup = None
 
 # Initialize database on startup
 async def setup_db():
+    if FAST_START and await get_schema_version() == SCHEMA_VERSION:
+        logger.info(f"Database schema is at version {SCHEMA_VERSION}, skipping setup")
+        return
     logger.info("Initializing database...")
     await init_db()
     logger.info("Populating sample data...")
     await populate_sample_data()
+    if not await mark_setup_complete():
+        logger.warning("Storage migration pending, run `python -m app.database.migrate`")
     logger.info("Database setup complete!")
 
+async def warm_up_llm_service():
+    try:
+        await load_llm_service()
+        logger.info("LLM service ready")
+    except Exception as e:
+        logger.error(f"LLM service initialization failed, will retry on demand: {str(e)}")
+
+def start_llm_warmup():
+    global llm_warmup
+    if llm_warmup is None or llm_warmup.done():
+        llm_warmup = asyncio.create_task(warm_up_llm_service())
+
 app = FastAPI(title="SecureInfo Concierge", description="Financial assistant application with LLM integration")
+app.add_middleware(AdmissionControlMiddleware)
 
 @app.on_event("startup")
 async def startup_event():
@@ -48,22 +77,37 @@ async def startup_event():
     logger.info("="*50)
     logger.info("Initializing services...")
     
+    executor_manager.start()
+    
     # Setup database
     start_time = asyncio.get_event_loop().time()
     await setup_db()
     db_time = asyncio.get_event_loop().time() - start_time
     logger.info(f"Database initialization completed in {db_time:.2f} seconds")
     
+    if FAST_START:
+        start_llm_warmup()
+    else:
+        await load_llm_service()
+    
     logger.info("All services initialized successfully!")
     logger.info("="*50 + "\n")
     
     # Set the app as ready after all initialization is complete
-    # Note: This will be set to True after all models are loaded
-    # The models are loaded when the first request comes in
+    # Note: This will be set to True once the LLM service has been created,
+    # which happens in the background in fast-start mode
     # app_ready will be set to True in the /ready endpoint
 
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+@app.on_event("shutdown")
+async def shutdown_event():
+    logger.info("Shutting down executors...")
+    executor_manager.shutdown()
+
+app.mount("/static", PrecompressedStaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
+templates.env.globals["asset_url"] = asset_url
+# The pages contain no per-request data, so they are rendered only once
+page_cache = PageCache(templates)
 
 app.include_router(api_router, prefix="/api")
 app.include_router(auth_router, prefix="/api")
@@ -73,6 +117,11 @@ async def health_check():
     """Simple health check endpoint that always returns 200 OK"""
     return {"status": "ok"}
 
+@app.get("/metrics/executors")
+async def executor_metrics():
+    """Queue depths and wait times of the offload executors, for sizing the pools"""
+    return executor_manager.metrics()
+
 @app.get("/ready")
 async def ready_check():
     """Readiness check endpoint that returns 200 only when the app is fully initialized"""
@@ -82,17 +131,13 @@ async def ready_check():
     if app_ready:
         return {"status": "ready", "uptime": f"{time.time() - startup_time:.2f} seconds"}
     
-    # Check if models are loaded by importing the LLM service
-    # This will trigger the model loading if it hasn't happened yet
-    try:
-        from app.models.llm_service import LLMService
-        # Create an instance to ensure models are loaded
-        _ = LLMService()
-        # If we get here, models are loaded successfully
+    if llm_service_ready():
         app_ready = True
         return {"status": "ready", "uptime": f"{time.time() - startup_time:.2f} seconds"}
-    except Exception as e:
-        # If models are still loading, return 503 Service Unavailable
+    else:
+        # Still loading, or the last attempt failed: (re)start it in the
+        # background and return 503 Service Unavailable
+        start_llm_warmup()
         return JSONResponse(
             status_code=503,
             content={
@@ -104,11 +149,11 @@ async def ready_check():
 
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
-    return templates.TemplateResponse("dashboard.html", {"request": request})
+    return page_cache.response(request, "dashboard.html")
 
 @app.get("/login", response_class=HTMLResponse)
 async def login(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return page_cache.response(request, "index.html")
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,11 +1,22 @@
 import re
+import os
+import json
+import hashlib
 import logging
-from openai import AzureOpenAI
+import threading
 from app.config.credentials_service import CredentialsService
+from app.cache.backends import create_cache
+from app.executors.pool import offload
 
 
 logger = logging.getLogger(__name__)
 
+INTENT_CACHE_TTL = int(os.environ.get("INTENT_CACHE_TTL", 24 * 60 * 60))
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 5 * 60))
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.split()).lower()
+
 class LLMService:
     """Service for generating responses using Azure OpenAI"""
     
@@ -14,6 +25,10 @@ class LLMService:
         logger.info("Initializing LLM Service with Azure OpenAI...")
         
         try:
+            # openai takes about a second to import, so it is only loaded
+            # once the service is actually needed
+            from openai import AzureOpenAI
+            
             self.credentials_service = CredentialsService()
             credentials = self.credentials_service.get_credentials()
             
@@ -29,6 +44,9 @@ class LLMService:
             )
             logger.info("Azure OpenAI client initialized successfully")
             
+            self.intent_cache = create_cache("intents", max_entries=10000)
+            self.response_cache = create_cache("responses", max_entries=2000)
+            
         except ValueError as e:
             logger.error(f"Configuration error: {str(e)}")
             raise
@@ -36,28 +54,42 @@ class LLMService:
             logger.error(f"Error initializing Azure OpenAI client: {str(e)}")
             raise
     
-    def generate_response(self, query, context=None):
+    def generate_response(self, query, context=None, history=None, summary=None):
+        """Answer a query, optionally as the next turn of a conversation
+        
+        Args:
+            query: The user's query
+            context: Data retrieved for the query's intent
+            history: Recent turns as {"role", "content"} dicts, oldest first
+            summary: Rolling summary of turns older than history
+        """
         system_message = "You are a secure financial information concierge. "
         system_message += "Provide helpful, accurate, and concise responses about financial information. "
         system_message += "Never reveal sensitive information unless explicitly authorized. "
         
+        if summary:
+            system_message += f"\nSummary of the earlier conversation:\n{summary}"
+        
         if context:
             system_message += f"\nHere is the relevant context for the user:\n{context}"
         
+        history = history or []
+        
+        # The context carries the user's data, so identical keys only occur
+        # for the same question asked against the same data and conversation.
+        cache_key = hashlib.sha256(
+            f"{normalize_query(query)}\x00{context or ''}\x00{summary or ''}\x00{json.dumps(history)}".encode()
+        ).hexdigest()
+        
         try:
-            response = self.client.chat.completions.create(
-                model=self.deployment_name,
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": query}
-                ],
-                temperature=0.7,
-                max_tokens=256,
-                top_p=0.95
+            content = self.response_cache.get_or_compute(
+                cache_key,
+                lambda: self._complete(system_message, query, history),
+                ttl=RESPONSE_CACHE_TTL
             )
             
-            if response.choices and len(response.choices) > 0:
-                return response.choices[0].message.content
+            if content is not None:
+                return content
             else:
                 return "I'm sorry, I couldn't generate a response. Please try again."
                 
@@ -65,10 +97,62 @@ class LLMService:
             print(f"Error generating response: {str(e)}")
             return f"I'm sorry, there was an error processing your request: {str(e)}"
     
-    def classify_intent(self, query, candidate_labels):
+    def _complete(self, system_message, query, history):
+        response = self.client.chat.completions.create(
+            model=self.deployment_name,
+            messages=[
+                {"role": "system", "content": system_message},
+                *history,
+                {"role": "user", "content": query}
+            ],
+            temperature=0.7,
+            max_tokens=256,
+            top_p=0.95
+        )
+        
+        if response.choices and len(response.choices) > 0:
+            return response.choices[0].message.content
+        return None
+    
+    def summarize_conversation(self, summary, messages):
+        """Fold conversation turns into a rolling summary
+        
+        Args:
+            summary: The existing summary, possibly empty
+            messages: Turns to add, as {"role", "content"} dicts
+            
+        Returns:
+            The updated summary, or None if it could not be generated
+        """
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        prompt = f"Existing summary:\n{summary or '(none)'}\n\nNew conversation turns:\n{transcript}\n\nUpdated summary:"
+        
+        try:
+            response = self.client.chat.completions.create(
+                model=self.deployment_name,
+                messages=[
+                    {"role": "system", "content": "You maintain a running summary of a conversation between a user and a financial assistant. Merge the new turns into the existing summary. Keep the facts, figures, time periods and open questions needed to understand follow-up questions. Respond only with the summary, in under 150 words."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.3,
+                max_tokens=200
+            )
+            
+            if response.choices and len(response.choices) > 0:
+                return response.choices[0].message.content.strip()
+            return None
+        except Exception as e:
+            logger.error(f"Error summarizing conversation: {str(e)}")
+            return None
+    
+    def classify_intent(self, query, candidate_labels, previous_query=None):
         """Classify the intent of the user query using Azure OpenAI"""
         try:
-            prompt = f"Classify the following query into one of these categories: {', '.join(candidate_labels)}\n\nQuery: {query}\n\nCategory:"
+            prompt = f"Classify the following query into one of these categories: {', '.join(candidate_labels)}\n\n"
+            if previous_query:
+                # Lets follow-ups like "and last month?" inherit the topic
+                prompt += f"Previous query in the conversation: {previous_query}\n"
+            prompt += f"Query: {query}\n\nCategory:"
             
             response = self.client.chat.completions.create(
                 model=self.deployment_name,
@@ -100,8 +184,8 @@ class LLMService:
             print(f"Error classifying intent: {str(e)}")
             return None
     
-    def interpret_user_intent(self, query):
-        """Interpret the user's intent from their query"""
+    def interpret_user_intent(self, query, previous_query=None):
+        """Interpret the user's intent from their query and, in a conversation, the one before it"""
         intents = [
             "account_balance",
             "transaction_history",
@@ -112,7 +196,15 @@ class LLMService:
         ]
         
         try:
-            result = self.classify_intent(query, intents)
+            # classify_intent returns None on failure, which is never cached
+            cache_key = normalize_query(query)
+            if previous_query:
+                cache_key = f"{normalize_query(previous_query)}\x00{cache_key}"
+            result = self.intent_cache.get_or_compute(
+                cache_key,
+                lambda: self.classify_intent(query, intents, previous_query),
+                ttl=INTENT_CACHE_TTL
+            )
             if result:
                 return result
             else:
@@ -168,3 +260,28 @@ Remember: Banking queries that mention "transactions", "balance", "spending", "a
 
         return True
 
+_service = None
+_service_lock = threading.Lock()
+
+def get_llm_service() -> LLMService:
+    """Get the shared LLMService, creating it on first use
+    
+    Creation fetches credentials over the network, so from async code use
+    load_llm_service instead.
+    """
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = LLMService()
+    return _service
+
+def llm_service_ready() -> bool:
+    """Whether the shared LLMService has been created"""
+    return _service is not None
+
+async def load_llm_service() -> LLMService:
+    """Get the shared LLMService without blocking the event loop on its creation"""
+    if _service is not None:
+        return _service
+    return await offload("io", get_llm_service)
@@ -0,0 +1,199 @@
+import logging
+import os
+import secrets
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from app.cache.backends import create_cache
+
+logger = logging.getLogger(__name__)
+
+SESSION_MAX_MESSAGES = int(os.environ.get("SESSION_MAX_MESSAGES", 20))
+SESSION_HISTORY_TOKENS = int(os.environ.get("SESSION_HISTORY_TOKENS", 1000))
+SESSION_IDLE_TIMEOUT = int(os.environ.get("SESSION_IDLE_TIMEOUT", 30 * 60))
+SESSION_MAX_SESSIONS = int(os.environ.get("SESSION_MAX_SESSIONS", 10000))
+# How long a compaction may run before another one may take over
+SESSION_COMPACTION_LEASE = int(os.environ.get("SESSION_COMPACTION_LEASE", 120))
+# How often an update is retried when other writes to the session keep winning
+SESSION_UPDATE_ATTEMPTS = int(os.environ.get("SESSION_UPDATE_ATTEMPTS", 5))
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English text
+    return len(text) // 4 + 1
+
+
+class Message:
+    """One conversation turn, numbered in order within its session"""
+
+    __slots__ = ("seq", "role", "content", "tokens")
+
+    def __init__(self, seq: int, role: str, content: str):
+        self.seq = seq
+        self.role = role
+        self.content = content
+        self.tokens = estimate_tokens(content)
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"role": self.role, "content": self.content}
+
+
+class Session:
+    """A conversation: a rolling summary of older turns plus a ring buffer of recent ones
+
+    The buffer holds at most SESSION_MAX_MESSAGES messages. Once the buffered
+    messages exceed SESSION_HISTORY_TOKENS, or the buffer is nearly full, the
+    oldest ones are due to be folded into the summary (see needs_compaction
+    and compact).
+    """
+
+    __slots__ = ("session_id", "owner", "messages", "summary", "next_seq", "compacting_until")
+
+    def __init__(self, session_id: str, owner: Optional[str]):
+        self.session_id = session_id
+        self.owner = owner
+        self.messages: deque = deque(maxlen=SESSION_MAX_MESSAGES)
+        self.summary = ""
+        self.next_seq = 0
+        # Wall-clock time until which a compaction is in progress
+        self.compacting_until = 0.0
+
+    def add(self, role: str, content: str) -> None:
+        self.messages.append(Message(self.next_seq, role, content))
+        self.next_seq += 1
+
+    def history(self, max_tokens: int = SESSION_HISTORY_TOKENS) -> List[Dict[str, str]]:
+        """The most recent messages that fit in max_tokens, oldest first
+
+        Bounds the history even while a compaction is still pending.
+        """
+        selected = []
+        used = 0
+        for message in reversed(self.messages):
+            if used + message.tokens > max_tokens:
+                break
+            selected.append(message)
+            used += message.tokens
+        return [message.to_dict() for message in reversed(selected)]
+
+    def last_user_message(self) -> Optional[str]:
+        for message in reversed(self.messages):
+            if message.role == "user":
+                return message.content
+        return None
+
+    def needs_compaction(self) -> bool:
+        if self.compacting_until > time.time():
+            return False
+        total = sum(message.tokens for message in self.messages)
+        return total > SESSION_HISTORY_TOKENS or len(self.messages) >= SESSION_MAX_MESSAGES - 2
+
+    def start_compaction(self) -> None:
+        """Mark a compaction as in progress, until it finishes or its lease runs out"""
+        self.compacting_until = time.time() + SESSION_COMPACTION_LEASE
+
+    def oldest_for_compaction(self) -> List[Message]:
+        """The oldest messages to summarize so that about half the budget remains"""
+        remaining = sum(message.tokens for message in self.messages)
+        selected = []
+        for message in self.messages:
+            if remaining <= SESSION_HISTORY_TOKENS // 2 and len(self.messages) - len(selected) < SESSION_MAX_MESSAGES // 2:
+                break
+            selected.append(message)
+            remaining -= message.tokens
+        return selected
+
+    def compact(self, summarized: List[Message], summary: str) -> None:
+        """Replace summarized messages with the new summary
+
+        The session may have been reloaded, and messages appended (or, if
+        the buffer overflowed, dropped) while the summary was being
+        generated, so messages are matched by sequence number and only
+        those up to the last summarized one are removed.
+        """
+        last_seq = summarized[-1].seq
+        while self.messages and self.messages[0].seq <= last_seq:
+            self.messages.popleft()
+        self.summary = summary
+
+    def to_state(self) -> Dict[str, Any]:
+        """JSON-serializable state, for storing in a cache backend"""
+        return {
+            "owner": self.owner,
+            "summary": self.summary,
+            "next_seq": self.next_seq,
+            "compacting_until": self.compacting_until,
+            "messages": [[message.seq, message.role, message.content] for message in self.messages],
+        }
+
+    @classmethod
+    def from_state(cls, session_id: str, state: Dict[str, Any]) -> "Session":
+        session = cls(session_id, state["owner"])
+        session.summary = state["summary"]
+        session.next_seq = state["next_seq"]
+        session.compacting_until = state["compacting_until"]
+        session.messages.extend(Message(seq, role, content) for seq, role, content in state["messages"])
+        return session
+
+
+class SessionStore:
+    """Sessions kept in the configured cache backend
+
+    With a shared backend (CACHE_BACKEND=sqlite) every worker sees every
+    session, so a conversation continues on whichever worker serves its
+    next turn. Each save refreshes the idle timeout, and beyond
+    max_sessions the least recently saved sessions are evicted.
+
+    Changes go through update, which applies them to the stored state
+    with a compare-and-set and retries on conflict, so concurrent turns
+    and a finishing compaction never overwrite each other.
+    """
+
+    def __init__(self, idle_timeout: int = SESSION_IDLE_TIMEOUT, max_sessions: int = SESSION_MAX_SESSIONS):
+        self.idle_timeout = idle_timeout
+        self._store = create_cache("sessions", max_entries=max_sessions)
+
+    async def create(self, owner: Optional[str]) -> Session:
+        """Start a new session for a user (or None for anonymous)"""
+        session = Session(secrets.token_urlsafe(24), owner)
+        await self.save(session)
+        return session
+
+    async def get(self, session_id: str, owner: Optional[str]) -> Optional[Session]:
+        """Load a live session, only if it belongs to owner"""
+        state = await self._store.aget(session_id)
+        if state is None or state["owner"] != owner:
+            return None
+        return Session.from_state(session_id, state)
+
+    async def save(self, session: Session) -> None:
+        """Store a session whole, replacing any concurrent changes"""
+        await self._store.aset(session.session_id, session.to_state(), ttl=self.idle_timeout)
+
+    async def update(self, session_id: str, owner: Optional[str], apply: Callable[[Session], None],
+                     attempts: int = SESSION_UPDATE_ATTEMPTS) -> Optional[Session]:
+        """Apply a change to the stored session and save it
+
+        apply is called on a freshly loaded copy and again on each retry,
+        so it must only depend on the session it is given.
+
+        Returns:
+            The updated session, or None if it is gone or kept changing
+        """
+        for _ in range(attempts):
+            state = await self._store.aget(session_id)
+            if state is None or state["owner"] != owner:
+                return None
+            session = Session.from_state(session_id, state)
+            apply(session)
+            if await self._store.areplace(session_id, state, session.to_state(), ttl=self.idle_timeout):
+                return session
+        logger.warning(f"Gave up updating session {session_id} after {attempts} conflicting writes")
+        return None
+
+    async def delete(self, session_id: str, owner: Optional[str]) -> bool:
+        if await self.get(session_id, owner) is None:
+            return False
+        await self._store.adelete(session_id)
+        return True
@@ -5,6 +5,7 @@ document.addEventListener("DOMContentLoaded", function () {
   const userName = document.getElementById("user-name");
 
   const token = localStorage.getItem("accessToken");
+  let sessionId = null;
 
   if (token) {
     fetchUserInfo(token);
@@ -82,13 +83,19 @@ document.addEventListener("DOMContentLoaded", function () {
           headers.Authorization = `Bearer ${token}`;
         }
 
-        const response = await fetch("/api/secure-query", {
-          method: "POST",
-          headers: headers,
-          body: JSON.stringify({
-            query: query,
-          }),
-        });
+        if (!sessionId) {
+          sessionId = await createSession(headers);
+        }
+
+        let response = await sendQuery(headers, query);
+        let sessionReset = false;
+
+        if (response.status === 404 && sessionId) {
+          // The session expired; start a new one, retry once and say so
+          sessionId = await createSession(headers);
+          response = await sendQuery(headers, query);
+          sessionReset = true;
+        }
 
         const data = await response.json();
 
@@ -97,6 +104,12 @@ document.addEventListener("DOMContentLoaded", function () {
             data.response
           )}</div>`;
 
+          if (sessionReset) {
+            responseHTML =
+              '<p class="placeholder">Your previous conversation expired, so this answer does not take your earlier questions into account.</p>' +
+              responseHTML;
+          }
+
           responseContent.innerHTML = responseHTML;
         } else if (responseContent) {
           responseContent.innerHTML = `<p class="error-message">${
@@ -119,6 +132,33 @@ document.addEventListener("DOMContentLoaded", function () {
     });
   }
 
+  async function createSession(headers) {
+    try {
+      const response = await fetch("/api/sessions", {
+        method: "POST",
+        headers: headers,
+      });
+      if (response.ok) {
+        const data = await response.json();
+        return data.session_id;
+      }
+    } catch (error) {
+      console.error("Error creating session:", error);
+    }
+    return null;
+  }
+
+  function sendQuery(headers, query) {
+    return fetch("/api/secure-query", {
+      method: "POST",
+      headers: headers,
+      body: JSON.stringify({
+        query: query,
+        session_id: sessionId,
+      }),
+    });
+  }
+
   function formatResponse(text) {
     return text.replace(/\n/g, "<br>");
   }
@@ -0,0 +1,127 @@
+"""Benchmark the spending analytics engine on a year of dense history
+
+Usage:
+    python -m benchmarks.bench_analytics [--transactions 120000] [--users 3] [--repeat 5]
+
+Generates synthetic users in a temporary SQLite database, then times
+loading each history into a TransactionFrame, the analysis passes, and
+cached (LRU hit) summaries.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+_tmpdir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_PATH"] = os.path.join(_tmpdir.name, "bench.db")
+
+import aiosqlite
+
+from app.analytics.spending import (
+    SpendingAnalytics, TransactionFrame, category_shares, detect_anomalies,
+    detect_recurring, format_summary, monthly_trends, summarize
+)
+from app.database import db_manager
+
+CATEGORIES = ["groceries", "dining", "coffee", "transport", "shopping", "utilities", "entertainment"]
+SUBSCRIPTIONS = [("Streaming subscription", 1599, 30), ("Gym membership", 4500, 30), ("Weekly meal kit", 6999, 7)]
+
+
+def generate_rows(account_id, count, end_ts, seed):
+    rng = random.Random(seed)
+    start_ts = end_ts - 365 * 86400
+    rows = []
+    for name, cents, interval in SUBSCRIPTIONS:
+        for ts in range(start_ts, end_ts, interval * 86400):
+            rows.append((account_id, 'debit', cents, name, 'subscriptions', ts))
+    for ts in range(start_ts, end_ts, 30 * 86400):
+        rows.append((account_id, 'credit', 500000, 'Salary deposit', 'income', ts))
+    while len(rows) < count:
+        category = rng.choice(CATEGORIES)
+        cents = int(rng.lognormvariate(7, 0.6))
+        if rng.random() < 0.0005:
+            cents *= 40
+        rows.append((account_id, 'debit', cents, f"{category.title()} purchase #{rng.randrange(500)}",
+                     category, rng.randrange(start_ts, end_ts)))
+    return rows
+
+
+async def populate(users, count, end_ts):
+    await db_manager.init_db()
+    async with aiosqlite.connect(db_manager.DATABASE_PATH) as db:
+        for i in range(users):
+            cursor = await db.execute(
+                "INSERT INTO user_accounts (username, account_number, balance_cents, account_type) VALUES (?, ?, ?, ?)",
+                (f"user{i}", f"0000-{i:04d}", 0, 'checking')
+            )
+            await db.executemany(
+                "INSERT INTO transactions (account_id, transaction_type, amount_cents, description, category, transaction_ts) VALUES (?, ?, ?, ?, ?, ?)",
+                generate_rows(cursor.lastrowid, count, end_ts, seed=i)
+            )
+        await db.commit()
+
+
+def timed(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return result, statistics.median(samples) * 1000
+
+
+async def main(count, users, repeat):
+    end_ts = int(time.time())
+    await populate(users, count, end_ts)
+    print(f"{users} users x {count:,} transactions over 365 days (median of {repeat} runs)\n")
+
+    analytics = SpendingAnalytics()
+    for i in range(users):
+        username = f"user{i}"
+
+        start = time.perf_counter()
+        rows = db_manager.read_transaction_columns(username)
+        query_ms = (time.perf_counter() - start) * 1000
+
+        frame, build_ms = timed(lambda: TransactionFrame.from_rows(rows), repeat)
+        since_ts = end_ts - 30 * 86400
+        _, monthly_ms = timed(lambda: monthly_trends(frame), repeat)
+        _, shares_ms = timed(lambda: category_shares(frame, since_ts), repeat)
+        recurring, recurring_ms = timed(lambda: detect_recurring(frame), repeat)
+        anomalies, anomalies_ms = timed(lambda: detect_anomalies(frame, since_ts), repeat)
+        summary, summary_ms = timed(lambda: summarize(frame, end_ts), repeat)
+        text, format_ms = timed(lambda: format_summary(summary), repeat)
+
+        await analytics.get_frame(username)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            await analytics.get_frame(username)
+        hit_ms = (time.perf_counter() - start) / repeat * 1000
+
+        print(f"{username}: {len(frame):,} rows, {len(recurring)} recurring, {len(anomalies)} anomalies, "
+              f"{len(text)} chars of context")
+        print(f"  sqlite load        {query_ms:8.2f} ms")
+        print(f"  frame build        {build_ms:8.2f} ms")
+        print(f"  monthly trends     {monthly_ms:8.2f} ms")
+        print(f"  category shares    {shares_ms:8.2f} ms")
+        print(f"  recurring          {recurring_ms:8.2f} ms")
+        print(f"  anomalies          {anomalies_ms:8.2f} ms")
+        print(f"  full summary       {summary_ms:8.2f} ms")
+        print(f"  format             {format_ms:8.2f} ms")
+        print(f"  LRU hit            {hit_ms:8.4f} ms\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transactions", type=int, default=120_000)
+    parser.add_argument("--users", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.transactions, args.users, args.repeat))
+    finally:
+        _tmpdir.cleanup()
@@ -0,0 +1,112 @@
+"""Benchmark cold start: import-time breakdown and time to first request
+
+Usage:
+    python -m benchmarks.bench_startup [--top 15] [--runs 3] [--target 1.5]
+
+Reports the `python -X importtime` cost of `import app.main` summed by
+top-level package, then starts uvicorn repeatedly and measures how long it
+takes until /health first answers, against a fresh database and against
+one whose schema version is already current. Credentials are pointed at
+an unreachable address so network setup cannot hide in the numbers.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import defaultdict
+
+# Time from process start to the first successful /health response
+TTFR_TARGET_SECONDS = 1.5
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def bench_env(database_path):
+    env = dict(os.environ)
+    env["DATABASE_PATH"] = database_path
+    env["ENGINE_WILCO_AI_URL"] = "http://127.0.0.1:9/credentials"
+    return env
+
+
+def import_report(env, top):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+
+    by_package = defaultdict(int)
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # column header
+        self_us, name = int(fields[0]), fields[2].strip()
+        # Self times add up to the total without double counting parents
+        by_package[name.split(".")[0]] += self_us
+        total += self_us
+
+    print(f"import app.main: {total / 1000:.1f} ms total, by top-level package (self time)")
+    for package, us in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"  {package:<30} {us / 1000:8.1f} ms")
+    return total / 1e6
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_first_request(env, timeout=30.0):
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError("server did not answer /health")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(top, runs, target):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database_path = os.path.join(tmpdir, "bench.db")
+        env = bench_env(database_path)
+
+        import_report(env, top)
+        print()
+
+        cold = time_to_first_request(env)
+        warm = sorted(time_to_first_request(env) for _ in range(runs))[runs // 2]
+
+    print(f"time to first request, fresh database:   {cold:6.3f} s")
+    print(f"time to first request, current schema:   {warm:6.3f} s (median of {runs})")
+    print(f"target {target:.2f} s: {'PASS' if warm <= target else 'FAIL'}")
+    return warm <= target
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--target", type=float, default=TTFR_TARGET_SECONDS)
+    args = parser.parse_args()
+    sys.exit(0 if main(args.top, args.runs, args.target) else 1)
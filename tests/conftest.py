@@ -0,0 +1,75 @@
+import sqlite3
+
+import pytest
+
+from app.database import db_manager
+
+# The schema before storage moved to integer cents and epoch seconds
+LEGACY_SCHEMA = """
+CREATE TABLE client_data (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    query_tag TEXT NOT NULL,
+    info TEXT NOT NULL,
+    sensitivity_level INTEGER DEFAULT 1,
+    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE user_accounts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    account_number TEXT UNIQUE NOT NULL,
+    balance REAL NOT NULL,
+    account_type TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account_id INTEGER NOT NULL,
+    transaction_type TEXT NOT NULL,
+    amount REAL NOT NULL,
+    description TEXT,
+    category TEXT,
+    transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (account_id) REFERENCES user_accounts (id)
+);
+"""
+
+LEGACY_ACCOUNTS = [
+    (1, "johndoe", "1234-5678-9012-3456", 5432.10, "checking"),
+    (2, "janedoe", "2468-1357-9080-7060", 3578.92, "checking"),
+]
+
+LEGACY_TRANSACTIONS = [
+    (1, 1, "debit", 120.50, "Grocery shopping", "groceries", "2025-08-06 15:10:12"),
+    (2, 1, "debit", 4.50, "Coffee", "coffee", "2025-08-05 08:00:00"),
+    (3, 1, "credit", 3500.00, "Salary", "income", "2025-07-31 09:30:00"),
+    (4, 2, "debit", 65.30, "Lunch", "dining", "2025-08-01 12:15:00"),
+    (5, 2, "debit", 0.07, "Fee", "fees", "2025-08-02 23:59:59"),
+]
+
+
+@pytest.fixture
+def legacy_db(tmp_path, monkeypatch):
+    """A database in the legacy schema, used by db_manager for the test"""
+    path = str(tmp_path / "legacy.db")
+    with sqlite3.connect(path) as conn:
+        conn.executescript(LEGACY_SCHEMA)
+        conn.executemany(
+            "INSERT INTO user_accounts (id, username, account_number, balance, account_type) VALUES (?, ?, ?, ?, ?)",
+            LEGACY_ACCOUNTS
+        )
+        conn.executemany(
+            "INSERT INTO transactions (id, account_id, transaction_type, amount, description, category, transaction_date) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            LEGACY_TRANSACTIONS
+        )
+        conn.execute("INSERT INTO client_data (query_tag, info) VALUES ('balance_info', 'Account balance')")
+    conn.close()
+    monkeypatch.setattr(db_manager, "DATABASE_PATH", path)
+    return path
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """An empty database path, used by db_manager for the test"""
+    path = str(tmp_path / "fresh.db")
+    monkeypatch.setattr(db_manager, "DATABASE_PATH", path)
+    return path
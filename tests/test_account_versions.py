@@ -0,0 +1,66 @@
+import asyncio
+import sqlite3
+
+from app.database import db_manager, migrate
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def version(username="johndoe"):
+    return run(db_manager.get_account_version(username))
+
+
+def triggers(path):
+    with sqlite3.connect(path) as conn:
+        return sorted(row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'"))
+
+
+def test_writes_bump_version(fresh_db):
+    run(db_manager.init_db())
+    run(db_manager.populate_sample_data())
+
+    before = version()
+    run(db_manager.add_transaction(1, "debit", 12.5, "Lunch", "dining"))
+    after_transaction = version()
+    run(db_manager.update_account_balance(1, 100.0))
+    after_balance = version()
+
+    assert before < after_transaction < after_balance
+    assert version("nobody") == 0
+
+
+def test_writes_outside_helpers_bump_version(fresh_db):
+    run(db_manager.init_db())
+    run(db_manager.populate_sample_data())
+    before = version()
+
+    with sqlite3.connect(fresh_db) as conn:
+        conn.execute(
+            "INSERT INTO transactions (account_id, transaction_type, amount_cents, transaction_ts) VALUES (1, 'debit', 100, 0)"
+        )
+    inserted = version()
+    with sqlite3.connect(fresh_db) as conn:
+        conn.execute("DELETE FROM transactions WHERE account_id = 1 AND amount_cents = 100 AND transaction_ts = 0")
+    deleted = version()
+
+    assert before < inserted < deleted
+
+
+def test_legacy_database_gains_versions(legacy_db, tmp_path, monkeypatch):
+    # Triggers are dropped with their tables during the rebuild
+    run(db_manager.init_db())
+    before = version()
+    run(db_manager.add_transaction(1, "debit", 3.0, "Coffee", "coffee"))
+    assert version() > before
+
+    assert run(migrate.migrate()) is True
+    before = version()
+    run(db_manager.update_account_balance(1, 10.0))
+    assert version() > before
+
+    fresh_path = str(tmp_path / "compare.db")
+    monkeypatch.setattr(db_manager, "DATABASE_PATH", fresh_path)
+    run(db_manager.init_db())
+    assert triggers(legacy_db) == triggers(fresh_path)
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from app.api import admission, routes
+from app.api.admission import AdmissionController, AdmissionRejected, TokenBucketLimiter
+from app.auth.jwt import User
+
+
+def test_cost_above_capacity_leaves_bucket_in_debt():
+    limiter = TokenBucketLimiter(rate=2.0, capacity=10.0)
+
+    assert limiter.acquire("alice", cost=25, now=0.0) == 0
+    # 15 tokens in debt: the next token is 16 tokens, 8 seconds, away
+    assert limiter.acquire("alice", now=0.0) == pytest.approx(8.0)
+    assert limiter.acquire("alice", now=7.0) == pytest.approx(1.0)
+    assert limiter.acquire("alice", now=8.0) == 0
+
+
+def test_cost_above_capacity_waits_for_full_bucket():
+    limiter = TokenBucketLimiter(rate=2.0, capacity=10.0)
+
+    assert limiter.acquire("alice", cost=4, now=0.0) == 0
+    assert limiter.acquire("alice", cost=25, now=0.0) == pytest.approx(2.0)
+    assert limiter.acquire("alice", cost=25, now=2.0) == 0
+
+
+def test_retry_after_is_whole_seconds():
+    assert AdmissionRejected(429, "Too many requests", 7.2).headers["Retry-After"] == "8"
+    assert AdmissionRejected(429, "Too many requests", 0.1).headers["Retry-After"] == "1"
+
+
+def test_idle_keys_are_evicted():
+    limiter = TokenBucketLimiter(rate=1.0, capacity=2.0)
+    limiter.acquire("a", now=0.0)
+    limiter.acquire("b", now=0.5)
+    assert len(limiter) == 2
+
+    # Both buckets have refilled by now, so forgetting them changes nothing
+    limiter.acquire("c", now=5.0)
+    assert len(limiter) == 1
+
+
+def test_keys_are_bounded_by_max_keys():
+    limiter = TokenBucketLimiter(rate=1.0, capacity=2.0, max_keys=3)
+    for index in range(10):
+        limiter.acquire(f"key{index}", now=0.0)
+
+    assert len(limiter) == 3
+    # The most recently used keys are kept, still in debt
+    assert limiter.acquire("key9", cost=2, now=0.0) > 0
+
+
+@pytest.fixture
+def small_caps(monkeypatch):
+    monkeypatch.setattr(admission, "MAX_INFLIGHT", 4)
+    monkeypatch.setattr(admission, "ANON_MAX_INFLIGHT", 2)
+
+
+def test_anonymous_requests_leave_slots_for_users(small_caps):
+    controller = AdmissionController()
+    controller.admit(None, "10.0.0.1")
+    controller.admit(None, "10.0.0.2")
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit(None, "10.0.0.3")
+    assert rejected.value.status_code == 503
+
+    controller.admit("alice", None)
+    controller.admit("bob", None)
+    with pytest.raises(AdmissionRejected):
+        controller.admit("carol", None)
+    assert controller.inflight == 4
+
+    controller.release()
+    controller.admit("carol", None)
+
+
+def test_rejected_request_takes_nothing(small_caps):
+    controller = AdmissionController()
+
+    with pytest.raises(AdmissionRejected):
+        controller.admit("alice", None, cost=1, slots=5)
+    assert controller.inflight == 0
+
+    controller.admit("alice", None, cost=admission.USER_BURST + 1)
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("alice", None)
+    assert rejected.value.status_code == 429
+    assert controller.inflight == 1
+
+
+class StubLLMService:
+    def interpret_user_intent(self, query, previous_query=None):
+        return "general_question"
+
+    def generate_response(self, query, context):
+        return f"answer to {query}"
+
+
+def test_batch_slots_released_when_client_disconnects(monkeypatch):
+    controller = AdmissionController()
+    monkeypatch.setattr(routes, "admission_controller", controller)
+
+    async def load_llm_service():
+        return StubLLMService()
+
+    async def offload(queue, fn, *args):
+        # Every model call hangs until the request is cancelled
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(routes, "load_llm_service", load_llm_service)
+    monkeypatch.setattr(routes, "offload", offload)
+
+    async def disconnect():
+        request = routes.BatchQueryRequest(queries=[f"question {index}" for index in range(20)])
+        response = await routes.secure_query_batch(request, current_user=User(username="alice"))
+        assert controller.inflight == routes.BATCH_CONCURRENCY
+
+        # The server cancels the streaming task when the client goes away
+        streaming = asyncio.ensure_future(response.body_iterator.__anext__())
+        await asyncio.sleep(0)
+        streaming.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await streaming
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+    asyncio.run(disconnect())
+
+    assert controller.inflight == 0
@@ -0,0 +1,135 @@
+import os
+import time
+
+import pytest
+from fastapi.templating import Jinja2Templates
+from starlette.requests import Request
+
+from app.assets import serving
+from app.assets.build import DIST_DIR, MANIFEST_NAME, build_assets, prune_assets
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    path = tmp_path / "static"
+    (path / "css").mkdir(parents=True)
+    (path / "css" / "style.css").write_text("body { color: black; }")
+    return str(path)
+
+
+@pytest.fixture
+def templates(tmp_path, static_dir):
+    path = tmp_path / "templates"
+    path.mkdir()
+    (path / "page.html").write_text("<link href=\"{{ asset('css/style.css') }}\">")
+    templates = Jinja2Templates(directory=str(path))
+    templates.env.globals["asset"] = lambda name: serving.load_manifest(static_dir).get(name, name)
+    return templates
+
+
+def make_request(headers=None):
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(key.lower().encode(), value.encode()) for key, value in (headers or {}).items()],
+    })
+
+
+def rebuild(static_dir, content):
+    with open(os.path.join(static_dir, "css", "style.css"), "w") as f:
+        f.write(content)
+    return build_assets(static_dir)["css/style.css"]
+
+
+def test_rebuild_keeps_previous_files(static_dir):
+    first = rebuild(static_dir, "body { color: black; }")
+    second = rebuild(static_dir, "body { color: white; }")
+
+    assert first != second
+    for fingerprinted in (first, second):
+        assert os.path.exists(os.path.join(static_dir, fingerprinted))
+        assert os.path.exists(os.path.join(static_dir, fingerprinted + ".gz"))
+    assert serving.load_manifest(static_dir)["css/style.css"] == second
+
+
+def test_prune_removes_only_long_dropped_files(static_dir):
+    first = rebuild(static_dir, "body { color: black; }")
+    # Written long ago, but only dropped by the next build
+    old = time.time() - 7200
+    for path in (first, first + ".gz"):
+        os.utime(os.path.join(static_dir, path), (old, old))
+    second = rebuild(static_dir, "body { color: white; }")
+
+    assert prune_assets(static_dir, max_age=3600) == []
+
+    dropped = time.time() - 7200
+    for path in (first, first + ".gz"):
+        os.utime(os.path.join(static_dir, path), (dropped, dropped))
+    assert prune_assets(static_dir, max_age=3600) == sorted([first, first + ".gz"])
+    assert os.path.exists(os.path.join(static_dir, second))
+    assert os.path.exists(os.path.join(static_dir, DIST_DIR, MANIFEST_NAME))
+
+
+def test_page_cache_renders_again_after_rebuild(static_dir, templates):
+    first = rebuild(static_dir, "body { color: black; }")
+    cache = serving.PageCache(templates, static_dir)
+    response = cache.response(make_request(), "page.html")
+    assert first.encode() in response.body
+
+    second = rebuild(static_dir, "body { color: white; }")
+    response = cache.response(make_request(), "page.html")
+    assert second.encode() in response.body
+
+
+@pytest.mark.parametrize("header, accepted", [
+    ("gzip, deflate, br", True),
+    ("GZIP", True),
+    ("gzip;q=0.5", True),
+    ("gzip;q=0", False),
+    ("gzip; q=0.0", False),
+    ("deflate", False),
+    ("", False),
+    ("*", True),
+    ("*;q=0", False),
+    ("*;q=0, gzip", True),
+    ("gzip;q=0, *", False),
+    ("br;q=1, *;q=0.1", True),
+    ("gzip;q=abc", False),
+])
+def test_accepts_encoding(header, accepted):
+    assert serving.accepts_encoding(header, "gzip") is accepted
+
+
+def test_page_etag_differs_per_encoding(static_dir, templates):
+    build_assets(static_dir)
+    cache = serving.PageCache(templates, static_dir)
+
+    plain = cache.response(make_request(), "page.html")
+    compressed = cache.response(make_request({"Accept-Encoding": "gzip"}), "page.html")
+
+    assert plain.headers["ETag"] != compressed.headers["ETag"]
+    assert compressed.headers["ETag"] == plain.headers["ETag"][:-1] + '-gz"'
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert "Content-Encoding" not in plain.headers
+    assert plain.headers["Vary"] == compressed.headers["Vary"] == "Accept-Encoding"
+
+
+def test_page_not_modified_only_for_served_variant(static_dir, templates):
+    build_assets(static_dir)
+    cache = serving.PageCache(templates, static_dir)
+    plain_etag = cache.response(make_request(), "page.html").headers["ETag"]
+    gzip_etag = cache.response(make_request({"Accept-Encoding": "gzip"}), "page.html").headers["ETag"]
+
+    response = cache.response(make_request({"Accept-Encoding": "gzip", "If-None-Match": gzip_etag}), "page.html")
+    assert response.status_code == 304
+    assert response.headers["ETag"] == gzip_etag
+    assert "Content-Encoding" not in response.headers
+
+    # A validator for the plain page must not revalidate the gzip one
+    response = cache.response(make_request({"Accept-Encoding": "gzip", "If-None-Match": plain_etag}), "page.html")
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+
+    response = cache.response(make_request({"If-None-Match": f"W/{plain_etag}"}), "page.html")
+    assert response.status_code == 304
@@ -0,0 +1,175 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from app.cache import backends
+from app.cache.backends import MemoryCache, SQLiteCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(backends, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "memory":
+            return MemoryCache(**kwargs)
+        return SQLiteCache("test", path=str(tmp_path / "cache.db"), evict_every=1, **kwargs)
+    return make
+
+
+# Run in spawned processes, so they must be importable
+
+def wait_until(start_at):
+    time.sleep(max(0.0, start_at - time.time()))
+
+
+def slow_compute(path, start_at):
+    wait_until(start_at)
+    cache = SQLiteCache("test", path=path, poll_interval=0.01)
+
+    def compute():
+        with open(path + ".runs", "a") as f:
+            f.write("run\n")
+        time.sleep(0.5)
+        return {"answer": 42}
+
+    return cache.get_or_compute("key", compute)
+
+
+def count_up(path, start_at, times):
+    wait_until(start_at)
+    cache = SQLiteCache("test", path=path)
+    return [cache.incr("counter") for _ in range(times)]
+
+
+def in_processes(target, *args, processes=4):
+    context = multiprocessing.get_context("spawn")
+    # Spawning takes a while; start the work together once all are up
+    start_at = time.time() + 3.0
+    with context.Pool(processes) as pool:
+        return pool.starmap(target, [(*args[:1], start_at, *args[1:])] * processes)
+
+
+def test_ttl_expiry(clock, make_cache):
+    cache = make_cache()
+    cache.set("short", "value", ttl=10)
+    cache.set("forever", "value")
+
+    clock.sleep(9)
+    assert cache.get("short") == "value"
+    clock.sleep(2)
+    assert cache.get("short") is None
+    assert cache.get("forever") == "value"
+
+
+def test_size_eviction(clock, make_cache):
+    cache = make_cache(max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+        clock.sleep(1)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == "b"
+    assert cache.get("c") == "c"
+
+
+def test_memory_eviction_is_least_recently_used():
+    cache = MemoryCache(max_entries=2)
+    cache.set("a", "a")
+    cache.set("b", "b")
+    cache.get("a")
+    cache.set("c", "c")
+
+    assert cache.get("a") == "a"
+    assert cache.get("b") is None
+
+
+def test_compute_returning_none_is_not_stored(make_cache):
+    cache = make_cache()
+    runs = []
+
+    def compute():
+        runs.append(1)
+        return None
+
+    assert cache.get_or_compute("key", compute) is None
+    assert cache.get_or_compute("key", compute) is None
+    assert len(runs) == 2
+
+
+def test_replace(make_cache):
+    cache = make_cache()
+
+    assert cache.replace("key", None, {"n": 1}) is True
+    assert cache.replace("key", None, {"n": 2}) is False
+    assert cache.replace("key", {"n": 0}, {"n": 2}) is False
+    assert cache.replace("key", {"n": 1}, {"n": 2}) is True
+    assert cache.get("key") == {"n": 2}
+    assert cache.replace("key", {"n": 2}, None) is True
+    assert cache.get("key") is None
+
+
+def test_lease_taken_over_after_expiry(clock, tmp_path):
+    cache = SQLiteCache("test", path=str(tmp_path / "cache.db"), lease_timeout=5.0, poll_interval=0.5)
+    # A caller that died while computing
+    assert cache._acquire_lease("key", "dead")
+
+    started = clock.now
+    assert cache.get_or_compute("key", lambda: "value") == "value"
+    assert clock.now - started >= 5.0
+    assert cache.get("key") == "value"
+
+
+def test_memory_incr_is_atomic():
+    cache = MemoryCache()
+
+    def count_up_threads():
+        for _ in range(500):
+            cache.incr("counter")
+
+    threads = [threading.Thread(target=count_up_threads) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert cache.get("counter") == 4000
+
+
+def test_sqlite_incr_is_atomic_across_processes(tmp_path):
+    path = str(tmp_path / "cache.db")
+    SQLiteCache("test", path=path)
+
+    results = in_processes(count_up, path, 100)
+
+    values = sorted(value for result in results for value in result)
+    assert values == list(range(1, 401))
+
+
+def test_sqlite_single_flight_across_processes(tmp_path):
+    path = str(tmp_path / "cache.db")
+    SQLiteCache("test", path=path)
+
+    results = in_processes(slow_compute, path)
+
+    assert results == [{"answer": 42}] * 4
+    with open(path + ".runs") as f:
+        assert f.read().count("run") == 1
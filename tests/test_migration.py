@@ -0,0 +1,173 @@
+import asyncio
+import datetime
+import os
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.database import db_manager, migrate
+from tests.conftest import LEGACY_ACCOUNTS, LEGACY_TRANSACTIONS
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def schema(path):
+    with sqlite3.connect(path) as conn:
+        return {
+            table: (
+                conn.execute(f"PRAGMA table_info({table})").fetchall(),
+                conn.execute(f"PRAGMA foreign_key_list({table})").fetchall(),
+                conn.execute(f"PRAGMA index_list({table})").fetchall(),
+            )
+            for table in ("user_accounts", "transactions")
+        }
+
+
+def user_version(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def expected_ts(date):
+    return int(datetime.datetime.strptime(date, "%Y-%m-%d %H:%M:%S").timestamp())
+
+
+def stored_transactions(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT id, amount_cents, transaction_ts FROM transactions ORDER BY id").fetchall()
+
+
+@pytest.fixture
+def pacific_time(monkeypatch):
+    # Far enough from UTC that a mixed-up convention shows in the dates
+    monkeypatch.setenv("TZ", "America/Los_Angeles")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_concurrent_startup_expands_once(legacy_db):
+    async def start_workers():
+        await asyncio.gather(*(db_manager.init_db() for _ in range(6)))
+
+    run(start_workers())
+
+    assert user_version(legacy_db) == db_manager.MIGRATING_VERSION
+    with sqlite3.connect(legacy_db) as conn:
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(transactions)")]
+    assert columns.count("amount_cents") == 1
+    assert columns.count("transaction_ts") == 1
+
+
+def test_startup_leaves_migration_pending(legacy_db):
+    run(db_manager.init_db())
+
+    assert run(db_manager.mark_setup_complete()) is False
+    assert user_version(legacy_db) == db_manager.MIGRATING_VERSION
+
+
+def test_reads_and_writes_before_backfill(legacy_db):
+    run(db_manager.init_db())
+
+    accounts = run(db_manager.get_account_balance("johndoe"))
+    assert accounts[0]["balance"] == 5432.10
+
+    transactions = run(db_manager.get_recent_transactions("johndoe"))
+    assert [t["id"] for t in transactions] == [1, 2, 3]
+    assert transactions[0]["amount"] == 120.50
+    assert transactions[0]["transaction_date"] == datetime.datetime(2025, 8, 6, 15, 10, 12)
+
+    run(db_manager.add_transaction(1, "debit", 10.25, "Books", "shopping", datetime.datetime(2025, 8, 7, 10, 0, 0)))
+    run(db_manager.update_account_balance(2, 100.0))
+
+    assert run(db_manager.get_account_balance("johndoe"))[0]["balance"] == 5421.85
+    assert run(db_manager.get_account_balance("janedoe"))[0]["balance"] == 100.0
+    with sqlite3.connect(legacy_db) as conn:
+        # Legacy columns are kept in step until the contract step drops them
+        assert conn.execute("SELECT balance FROM user_accounts WHERE id = 1").fetchone()[0] == pytest.approx(5421.85)
+        assert conn.execute("SELECT amount, transaction_date FROM transactions WHERE id = 6").fetchone() == (10.25, "2025-08-07 10:00:00")
+
+
+def test_backfill_in_chunks_then_contract(legacy_db, tmp_path, monkeypatch):
+    run(db_manager.init_db())
+    run(db_manager.add_transaction(1, "debit", 10.25, "Books", "shopping", datetime.datetime(2025, 8, 7, 10, 0, 0)))
+
+    # Writes fill in the compact columns of the rows they touch, here the new
+    # transaction and johndoe's balance, so only the other rows are left
+    assert run(migrate.backfill(chunk_size=2)) == len(LEGACY_ACCOUNTS) - 1 + len(LEGACY_TRANSACTIONS)
+    assert run(migrate.backfill(chunk_size=2)) == 0
+    assert run(migrate.contract()) is True
+
+    assert user_version(legacy_db) == db_manager.SCHEMA_VERSION
+    assert stored_transactions(legacy_db) == [
+        (id, round(amount * 100), expected_ts(date))
+        for id, _, _, amount, _, _, date in LEGACY_TRANSACTIONS
+    ] + [(6, 1025, expected_ts("2025-08-07 10:00:00"))]
+    assert run(db_manager.get_account_balance("johndoe"))[0]["balance"] == 5421.85
+
+    # Ids are not reused after the rebuild
+    assert run(db_manager.add_transaction(2, "credit", 1.00)) == 7
+
+    fresh_db = str(tmp_path / "fresh.db")
+    monkeypatch.setattr(db_manager, "DATABASE_PATH", fresh_db)
+    run(db_manager.init_db())
+    assert schema(legacy_db) == schema(fresh_db)
+
+
+def test_resume_after_interrupt(legacy_db, monkeypatch):
+    class Interrupted(Exception):
+        pass
+
+    async def interrupt(_):
+        raise Interrupted
+
+    run(db_manager.init_db())
+    monkeypatch.setattr(migrate, "asyncio", SimpleNamespace(sleep=interrupt))
+    with pytest.raises(Interrupted):
+        run(migrate.migrate(chunk_size=1))
+
+    assert user_version(legacy_db) == db_manager.MIGRATING_VERSION
+    with sqlite3.connect(legacy_db) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM user_accounts WHERE balance_cents IS NOT NULL").fetchone()[0] == 1
+    # Half-converted data still reads correctly
+    assert run(db_manager.get_account_balance("janedoe"))[0]["balance"] == 3578.92
+
+    monkeypatch.undo()
+    monkeypatch.setattr(db_manager, "DATABASE_PATH", legacy_db)
+    assert run(migrate.migrate(chunk_size=1)) is True
+    assert user_version(legacy_db) == db_manager.SCHEMA_VERSION
+    assert len(stored_transactions(legacy_db)) == len(LEGACY_TRANSACTIONS)
+
+
+def test_contract_refuses_unconverted_rows(legacy_db):
+    run(db_manager.init_db())
+
+    with pytest.raises(RuntimeError):
+        run(migrate.contract())
+    assert user_version(legacy_db) == db_manager.MIGRATING_VERSION
+
+
+def test_legacy_dates_are_local_time(legacy_db, pacific_time):
+    assert run(migrate.migrate()) is True
+
+    transactions = run(db_manager.get_recent_transactions("janedoe"))
+    assert [t["transaction_date"] for t in transactions] == [
+        datetime.datetime(2025, 8, 2, 23, 59, 59),
+        datetime.datetime(2025, 8, 1, 12, 15, 0),
+    ]
+    assert stored_transactions(legacy_db)[0][2] == expected_ts("2025-08-06 15:10:12")
+
+
+def test_fresh_database_needs_no_migration(fresh_db):
+    run(db_manager.init_db())
+    run(db_manager.populate_sample_data())
+
+    assert run(db_manager.mark_setup_complete()) is True
+    assert run(migrate.migrate()) is False
+    assert os.path.exists(fresh_db)
+    assert user_version(fresh_db) == db_manager.SCHEMA_VERSION
@@ -0,0 +1,76 @@
+import asyncio
+
+from app.sessions.store import Session, SessionStore
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_update_retries_on_concurrent_write():
+    store = SessionStore()
+    session = run(store.create("johndoe"))
+    calls = []
+
+    def add_turn(current):
+        if not calls:
+            # Another worker saves in between this load and the write
+            other = Session.from_state(current.session_id, store._store.get(current.session_id))
+            other.summary = "Earlier: asked about balance"
+            store._store.set(current.session_id, other.to_state())
+        calls.append(current.summary)
+        current.add("user", "And my transactions?")
+
+    updated = run(store.update(session.session_id, "johndoe", add_turn))
+
+    assert calls == ["", "Earlier: asked about balance"]
+    stored = run(store.get(session.session_id, "johndoe"))
+    assert stored.summary == "Earlier: asked about balance"
+    assert [message.content for message in stored.messages] == ["And my transactions?"]
+    assert updated.next_seq == stored.next_seq == 1
+
+
+def test_turn_after_compaction_keeps_summary_and_clears_lease():
+    store = SessionStore()
+    session = run(store.create(None))
+    for index in range(4):
+        run(store.update(session.session_id, None, lambda current: current.add("user", f"question {index}")))
+
+    def start(current):
+        current.start_compaction()
+
+    compacting = run(store.update(session.session_id, None, start))
+    summarized = list(compacting.messages)[:2]
+
+    def finish(current):
+        current.compact(summarized, "summary")
+        current.compacting_until = 0.0
+
+    # A turn that started while the summary was being generated
+    run(store.update(session.session_id, None, finish))
+    run(store.update(session.session_id, None, lambda current: current.add("user", "question 4")))
+
+    stored = run(store.get(session.session_id, None))
+    assert stored.summary == "summary"
+    assert stored.compacting_until == 0.0
+    assert [message.seq for message in stored.messages] == [2, 3, 4]
+
+
+def test_update_of_missing_or_foreign_session():
+    store = SessionStore()
+    session = run(store.create("johndoe"))
+
+    assert run(store.update("missing", "johndoe", lambda current: None)) is None
+    assert run(store.update(session.session_id, "janedoe", lambda current: None)) is None
+
+
+def test_update_gives_up_when_writes_keep_winning():
+    store = SessionStore()
+    session = run(store.create(None))
+
+    def always_conflicts(current):
+        other = Session.from_state(current.session_id, store._store.get(current.session_id))
+        other.next_seq += 1
+        store._store.set(current.session_id, other.to_state())
+
+    assert run(store.update(session.session_id, None, always_conflicts, attempts=3)) is None